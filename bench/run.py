@@ -0,0 +1,260 @@
+"""Benchmark offline contra bench/server.py (sin tocar Facebook).
+
+Targets:
+    http     métodos del tier HTTP de FacebookSeleniumScraper (no necesita Chrome)
+    scraper  FacebookSeleniumScraper con Chrome, un navegador por hilo
+    api      endpoints de FastAPI en proceso (pool, scheduler, cache...)
+
+Ejemplos:
+    python bench/run.py --target http --concurrency 8 --iterations 50
+    python bench/run.py --target api --concurrency 4 --iterations 10 --json out.json --max-p95-ms 5000
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from server import FixtureServer  # noqa: E402
+
+# Escenario -> (tipo, ruta con {n} para que cada iteración sea una URL distinta)
+SCENARIOS = {
+    'post': ('post', '/bench/posts/1{n:04d}'),
+    'photo': ('post', '/bench/photos/a.1/2{n:04d}'),
+    'video_json': ('video', '/bench/posts/3{n:04d}'),
+    'video_network': ('video', '/bench/posts/4{n:04d}'),
+    'feed': ('page', '/bench'),
+}
+
+# El tier HTTP no ejecuta JS: no puede ver pedidos de red ni hacer scroll
+HTTP_TIER_SCENARIOS = ('post', 'photo', 'video_json')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class RssSampler:
+    """Muestrea el RSS del proceso y sus hijos (chromedriver/Chrome) y guarda el pico"""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        from driver_lifecycle import process_tree_rss
+        while not self._stop.is_set():
+            rss = process_tree_rss(os.getpid())
+            if rss:
+                self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def http_runner(args) -> Callable:
+    from scraper_selenium import FacebookSeleniumScraper
+    scraper = FacebookSeleniumScraper(headless=True)
+
+    def run(kind: str, url: str) -> bool:
+        if kind == 'post':
+            result = scraper.scrape_post_via_http(url)
+        else:
+            result = scraper.scrape_video_via_http(url)
+        return bool(result and result.get('success'))
+
+    return run
+
+
+def scraper_runner(args) -> Callable:
+    from scraper_selenium import FacebookSeleniumScraper
+    local = threading.local()
+    created = []
+    lock = threading.Lock()
+
+    def get_scraper():
+        if getattr(local, 'scraper', None) is None:
+            local.scraper = FacebookSeleniumScraper(headless=True)
+            local.scraper.setup_driver()
+            with lock:
+                created.append(local.scraper)
+        return local.scraper
+
+    def run(kind: str, url: str) -> bool:
+        scraper = get_scraper()
+        if kind == 'post':
+            result = scraper.scrape_post_by_url(url)
+        elif kind == 'video':
+            result = scraper.scrape_video_by_url(url)
+        else:
+            result = scraper.collect_page_post_links(url, args.num_posts)
+            return bool(result.get('success')) and len(result['links']) >= args.num_posts
+        return bool(result.get('success'))
+
+    def close():
+        for scraper in created:
+            scraper.close()
+
+    run.close = close
+    return run
+
+
+def api_runner(args, base_url: str) -> Callable:
+    # Se configura antes de importar la app: estos valores se leen al importar
+    os.environ.setdefault('SCRAPER_ALLOWED_HOSTS', '127.0.0.1,localhost')
+    os.environ.setdefault('SCRAPER_POOL_SIZE', str(args.concurrency))
+    # El servidor local no limita: sin tope de tasa el control adaptativo sólo acota la concurrencia
+    os.environ.setdefault('SCRAPER_THROTTLE_MAX_RATE', '0')
+    if not args.cache:
+        os.environ['SCRAPER_CACHE_TTL'] = '0'
+        os.environ['SCRAPER_RESULT_STORE'] = '0'
+
+    from fastapi.testclient import TestClient
+    import main_selenium
+
+    client = TestClient(main_selenium.app)
+    client.__enter__()
+
+    def run(kind: str, url: str) -> bool:
+        if kind == 'post':
+            r = client.get('/scrape', params={'url': url})
+        elif kind == 'video':
+            r = client.get('/scrape/video', params={'url': url})
+        else:
+            r = client.post('/scrape/page', json={'page_url': url, 'num_posts': args.num_posts})
+        return r.status_code == 200
+
+    run.close = lambda: client.__exit__(None, None, None)
+    return run
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark offline del scraper')
+    parser.add_argument('--target', choices=('http', 'scraper', 'api'), default='http')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Lista separada por comas')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=20, help='Requests por escenario')
+    parser.add_argument('--num-posts', type=int, default=20, help='Posts a recolectar en el escenario feed')
+    parser.add_argument('--page-delay', type=float, default=0.0, help='Latencia artificial del servidor (s)')
+    parser.add_argument('--cache', action='store_true', help='(api) dejar activas las caches de resultados')
+    parser.add_argument('--json', help='Guardar el reporte en este archivo')
+    parser.add_argument('--max-p95-ms', type=float, help='Falla (exit 1) si algún escenario supera este p95')
+    parser.add_argument('--max-error-rate', type=float, default=0.0, help='Falla si la tasa de error la supera')
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+    if args.target == 'http':
+        skipped = [s for s in scenarios if s not in HTTP_TIER_SCENARIOS]
+        if skipped:
+            print(f"(target http: se omiten {', '.join(skipped)})")
+        scenarios = [s for s in scenarios if s in HTTP_TIER_SCENARIOS]
+
+    server = FixtureServer(page_delay=args.page_delay).start()
+    if args.target == 'http':
+        run = http_runner(args)
+    elif args.target == 'scraper':
+        run = scraper_runner(args)
+    else:
+        run = api_runner(args, server.base_url)
+
+    # Escenarios intercalados para que compitan entre sí como en producción
+    tasks = [(name, n) for n in range(args.iterations) for name in scenarios]
+    latencies: Dict[str, List[float]] = {name: [] for name in scenarios}
+    errors: Dict[str, int] = {name: 0 for name in scenarios}
+    lock = threading.Lock()
+
+    def execute(task):
+        name, n = task
+        kind, path = SCENARIOS[name]
+        url = server.base_url + path.format(n=n)
+        start = time.perf_counter()
+        try:
+            ok = run(kind, url)
+        except Exception as e:
+            print(f"⚠️ {name}: {e}", file=sys.stderr)
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[name].append(elapsed * 1000)
+            if not ok:
+                errors[name] += 1
+
+    try:
+        with RssSampler() as rss:
+            wall_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                list(executor.map(execute, tasks))
+            wall = time.perf_counter() - wall_start
+    finally:
+        if hasattr(run, 'close'):
+            run.close()
+        server.stop()
+
+    report = {
+        'target': args.target,
+        'concurrency': args.concurrency,
+        'iterations': args.iterations,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(tasks) / wall, 2) if wall else 0.0,
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+        'scenarios': {},
+    }
+    for name in scenarios:
+        values = latencies[name]
+        report['scenarios'][name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'p50_ms': round(percentile(values, 50), 2),
+            'p95_ms': round(percentile(values, 95), 2),
+            'p99_ms': round(percentile(values, 99), 2),
+            'mean_ms': round(sum(values) / len(values), 2) if values else 0.0,
+        }
+
+    print(f"\ntarget={args.target} concurrency={args.concurrency} iterations={args.iterations}")
+    print(f"{'escenario':<15}{'reqs':>6}{'errores':>9}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for name, row in report['scenarios'].items():
+        print(f"{name:<15}{row['requests']:>6}{row['errors']:>9}{row['p50_ms']:>11.1f}{row['p95_ms']:>11.1f}{row['p99_ms']:>11.1f}")
+    print(f"\nthroughput: {report['throughput_rps']} req/s   tiempo total: {report['wall_seconds']} s   "
+          f"RSS pico: {report['peak_rss_mb']} MB")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    for name, row in report['scenarios'].items():
+        error_rate = row['errors'] / row['requests'] if row['requests'] else 0.0
+        if error_rate > args.max_error_rate:
+            print(f"❌ {name}: tasa de error {error_rate:.1%}", file=sys.stderr)
+            failed = True
+        if args.max_p95_ms is not None and row['p95_ms'] > args.max_p95_ms:
+            print(f"❌ {name}: p95 {row['p95_ms']} ms > {args.max_p95_ms} ms", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Servidor local que imita a Facebook móvil y a fbcdn para los benchmarks.
+
+Rutas:
+    /bench                       feed con scroll infinito (feed.html)
+    /bench/posts/<id>            post móvil con fotos (mobile_post.html)
+    /bench/posts/3<id>           video con playable_url en JSON (video_post.html)
+    /bench/posts/4<id>           video que sólo aparece en la red (video_network.html)
+    /bench/photos/<album>/<id>   foto (photo_post.html)
+    /media/<host>/<ruta>         fbcdn falso: HEAD y GET con Range sobre bytes deterministas
+
+Uso: python bench/server.py --port 8900
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+VIDEO_BYTES = 4 * 1024 * 1024
+IMAGE_BYTES = 48 * 1024
+FEED_TOTAL = 60
+
+_PATTERN = bytes(range(256))
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _load_fixtures():
+    fixtures = {}
+    for name in os.listdir(FIXTURES_DIR):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+                fixtures[name[:-5]] = f.read()
+    return fixtures
+
+
+def route_fixture(path: str) -> Optional[Tuple[str, str]]:
+    """(fixture, id) para una ruta de página, o None"""
+    path = path.rstrip('/')
+    if path == '/bench':
+        return 'feed', 'bench'
+    m = re.match(r'^/bench/photos/[^/]+/(\d+)$', path)
+    if m:
+        return 'photo_post', m.group(1)
+    m = re.match(r'^/bench/posts/(\d+)$', path)
+    if m:
+        post_id = m.group(1)
+        if post_id.startswith('3'):
+            return 'video_post', post_id
+        if post_id.startswith('4'):
+            return 'video_network', post_id
+        return 'mobile_post', post_id
+    return None
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'BenchFB/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, extra=None, head: bool = False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _page(self, head: bool):
+        parsed = urlparse(self.path)
+        routed = route_fixture(parsed.path)
+        if not routed:
+            self._send(404, b'not found', 'text/plain', head=head)
+            return
+        name, post_id = routed
+        media = f'http://{self.headers.get("Host")}/media'
+        html = (self.server.fixtures[name]
+                .replace('{{MEDIA_JSON}}', media.replace('/', '\\/'))
+                .replace('{{MEDIA}}', media)
+                .replace('{{POST_ID}}', post_id)
+                .replace('{{FEED_TOTAL}}', str(self.server.feed_total)))
+        if self.server.page_delay:
+            time.sleep(self.server.page_delay)
+        self._send(200, html.encode('utf-8'), 'text/html; charset=utf-8', head=head)
+
+    def _media(self, head: bool):
+        path = urlparse(self.path).path
+        size = self.server.video_bytes if path.endswith('.mp4') else self.server.image_bytes
+        content_type = 'video/mp4' if path.endswith('.mp4') else 'image/jpeg'
+
+        start, end, status = 0, size - 1, 200
+        m = _RANGE_RE.match(self.headers.get('Range', '').strip())
+        if m and (m.group(1) or m.group(2)):
+            if m.group(1):
+                start = int(m.group(1))
+                end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            else:
+                start = max(0, size - int(m.group(2)))
+            if start >= size or start > end:
+                self._send(416, b'', content_type, {'Content-Range': f'bytes */{size}'}, head=head)
+                return
+            status = 206
+
+        # Bytes deterministas: el contenido de cada offset es offset % 256
+        length = end - start + 1
+        offset = start % 256
+        body = (_PATTERN * ((offset + length) // 256 + 1))[offset:offset + length]
+        extra = {'Accept-Ranges': 'bytes'}
+        if status == 206:
+            extra['Content-Range'] = f'bytes {start}-{end}/{size}'
+        self._send(status, body, content_type, extra, head=head)
+
+    def _dispatch(self, head: bool):
+        if self.path.startswith('/media/'):
+            self._media(head)
+        else:
+            self._page(head)
+
+    def do_HEAD(self):
+        self._dispatch(head=True)
+
+    def do_GET(self):
+        self._dispatch(head=False)
+
+
+class FixtureServer:
+    """Servidor de fixtures en un hilo de fondo"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, page_delay: float = 0.0,
+                 video_bytes: int = VIDEO_BYTES, image_bytes: int = IMAGE_BYTES, feed_total: int = FEED_TOTAL):
+        self.httpd = ThreadingHTTPServer((host, port), FixtureHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fixtures = _load_fixtures()
+        self.httpd.page_delay = page_delay
+        self.httpd.video_bytes = video_bytes
+        self.httpd.image_bytes = image_bytes
+        self.httpd.feed_total = feed_total
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FixtureServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor local de fixtures de Facebook/fbcdn')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--page-delay', type=float, default=0.0, help='Latencia artificial por página (s)')
+    args = parser.parse_args()
+
+    server = FixtureServer(args.host, args.port, page_delay=args.page_delay)
+    print(f'Sirviendo fixtures en {server.base_url}/bench')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
@@ -0,0 +1,46 @@
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+# Patrones de Network.setBlockedURLs (comodín '*')
+IMAGES = ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.svg*', '*.ico*']
+MEDIA = ['*.mp4*', '*.m3u8*', '*.webm*', '*video.fsci*', '*.mpd*']
+FONTS = ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*']
+STYLES = ['*.css', '*.css?*']
+SCRIPTS = ['*.js', '*.js?*']
+TRACKERS = [
+    '*facebook.com/tr*',
+    '*connect.facebook.net*',
+    '*/ajax/bz*',
+    '*/ajax/webstorage/*',
+    '*/security/hsts-pixel*',
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+]
+
+# Perfil por endpoint: qué se bloquea en cada navegación.
+# setBlockedURLs sólo admite listas de bloqueo, así que "video" se aproxima
+# bloqueando todo lo que no sea DOM, JS (el reproductor) y la propia media.
+BLOCKING_PROFILES: Dict[str, List[str]] = {
+    'none': [],
+    'post-text': IMAGES + MEDIA + FONTS + STYLES + TRACKERS,
+    'images-only': IMAGES + MEDIA + FONTS + STYLES + TRACKERS + SCRIPTS,
+    'video': IMAGES + FONTS + STYLES + TRACKERS,
+    'feed': IMAGES + MEDIA + FONTS + STYLES + TRACKERS,
+}
+
+
+def apply_blocking_profile(driver, name: str) -> bool:
+    """Aplica el perfil vía CDP; devuelve False si el driver no soporta CDP"""
+    if name not in BLOCKING_PROFILES:
+        raise ValueError(f"Perfil de bloqueo desconocido: {name}")
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKING_PROFILES[name]})
+        return True
+    except Exception as e:
+        logger.debug(f"No se pudo aplicar el perfil de bloqueo {name}: {e}")
+        return False
@@ -0,0 +1,348 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+from driver_lifecycle import is_fatal_driver_error, process_tree_rss
+from network_capture import ScrapeCancelled
+from scraper_selenium import FacebookSeleniumScraper
+
+logger = logging.getLogger(__name__)
+
+
+# Las pestañas en segundo plano no deben frenar timers ni reproducción de video
+TAB_CHROME_ARGS = (
+    '--disable-background-timer-throttling',
+    '--disable-renderer-backgrounding',
+    '--disable-backgrounding-occluded-windows',
+)
+
+# Entradas de log de performance que se guardan por pestaña antes de descartar las viejas
+TAB_LOG_LIMIT = 10000
+
+POLL_INTERVAL = 0.05
+
+
+class SharedBrowser:
+    """Un solo Chrome con varias pestañas, cada una en su propio browser context.
+
+    Cada contexto tiene cookies, cache y storage aislados, así que una pestaña
+    equivale a un navegador nuevo a una fracción de la memoria. WebDriver tiene
+    una única ventana activa por sesión: los comandos de cada pestaña se
+    serializan con `lock` y cambian de ventana sólo si hace falta. Las
+    navegaciones van por Page.navigate y se esperan leyendo el log de
+    performance, de modo que una pestaña cargando no bloquea a las demás.
+
+    Para reciclarlo (ver DriverLifecycle.browser_recycle_reason) se marca
+    `draining`: el pool deja de asignarle pestañas y lo cierra cuando se va
+    la última.
+    """
+
+    def __init__(self, headless: bool = True, max_tabs: int = 4, navigation_timeout: float = 30.0):
+        self.headless = headless
+        self.max_tabs = max_tabs
+        self.navigation_timeout = navigation_timeout
+        self.lock = threading.RLock()
+        self.driver = None
+        # Se incrementa al relanzar Chrome: las pestañas de la generación anterior quedan muertas
+        self.generation = 0
+        self._launcher: Optional[FacebookSeleniumScraper] = None
+        self._home = None
+        self._current = None
+        self._tabs: Dict[str, 'TabDriver'] = {}
+        # Log de performance demultiplexado por pestaña (campo 'webview' de chromedriver)
+        self._logs: Dict[str, Deque[Dict]] = {}
+        self._dom_ready: Dict[str, int] = {}
+        # Navegaciones de todas las pestañas desde el último lanzamiento de Chrome
+        self.navigations = 0
+        self.draining = False
+
+        # Métricas
+        self.launches = 0
+        self.tabs_opened = 0
+        self.switches = 0
+
+    def _launch(self):
+        launcher = FacebookSeleniumScraper(headless=self.headless)
+        launcher.setup_driver(extra_args=TAB_CHROME_ARGS)
+        self._launcher = launcher
+        self.driver = launcher.driver
+        # La pestaña inicial queda abierta: si se cierran todas, chromedriver termina la sesión
+        self._home = self.driver.current_window_handle
+        self._current = self._home
+        self.navigations = 0
+        self.launches += 1
+        logger.info(f"🗂️ Navegador compartido lanzado (hasta {self.max_tabs} pestañas)")
+
+    def _discard(self):
+        """Olvida el Chrome actual; sus pestañas fallan con un error fatal y se reabren"""
+        launcher, self._launcher = self._launcher, None
+        self.driver = None
+        self._home = self._current = None
+        self._tabs.clear()
+        self._logs.clear()
+        self._dom_ready.clear()
+        self.generation += 1
+        if launcher:
+            launcher.close()
+
+    def _switch(self, handle: str):
+        if self._current != handle:
+            self.driver.switch_to.window(handle)
+            self._current = handle
+            self.switches += 1
+
+    def _activate(self, tab: 'TabDriver'):
+        if self.driver is None or tab.generation != self.generation or tab.handle not in self._tabs:
+            raise WebDriverException('invalid session id: la pestaña pertenece a un navegador que ya no existe')
+        self._switch(tab.handle)
+        return self.driver
+
+    def handle_error(self, error):
+        """Ante un error fatal en una pestaña, comprueba si murió sólo ella o todo Chrome"""
+        if not is_fatal_driver_error(error) or self.driver is None:
+            return
+        try:
+            self.driver.window_handles
+        except Exception as e:
+            if is_fatal_driver_error(e):
+                logger.warning("💥 El navegador compartido murió; se relanzará en la próxima pestaña")
+                self._discard()
+
+    def open_tab(self, cancel: Optional[threading.Event] = None) -> 'TabDriver':
+        with self.lock:
+            if self.driver is None:
+                self._launch()
+            driver = self.driver
+            self._switch(self._home)
+
+            context_id = None
+            try:
+                context_id = driver.execute_cdp_cmd('Target.createBrowserContext', {})['browserContextId']
+                target_id = driver.execute_cdp_cmd('Target.createTarget', {
+                    'url': 'about:blank',
+                    'browserContextId': context_id,
+                    'width': 1920,
+                    'height': 1080,
+                })['targetId']
+                # chromedriver usa el targetId como handle, pero tarda un poco en descubrirlo
+                deadline = time.monotonic() + 5
+                while target_id not in driver.window_handles:
+                    if time.monotonic() > deadline:
+                        raise WebDriverException(f'chromedriver no ve la pestaña {target_id}')
+                    time.sleep(POLL_INTERVAL)
+                handle = target_id
+            except Exception as e:
+                self.handle_error(e)
+                if self.driver is None:
+                    raise
+                # Sin contextos aislados queda una pestaña común; reset_session limpia cookies a mano
+                logger.debug(f"Browser contexts no disponibles, se usa una pestaña sin aislar: {e}")
+                if context_id:
+                    self._dispose_context(context_id)
+                context_id = None
+                driver.switch_to.new_window('tab')
+                handle = driver.current_window_handle
+
+            tab = TabDriver(self, handle, context_id, cancel=cancel)
+            self._tabs[handle] = tab
+            self._dom_ready[handle] = 0
+            self._current = None
+            # Al activarla chromedriver le conecta el log de performance
+            self._switch(handle)
+            self.tabs_opened += 1
+            return tab
+
+    def _dispose_context(self, context_id: str):
+        try:
+            self._switch(self._home)
+            self.driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': context_id})
+        except Exception as e:
+            logger.debug(f"No se pudo descartar el browser context: {e}")
+
+    def close_tab(self, tab: 'TabDriver'):
+        with self.lock:
+            if self._tabs.pop(tab.handle, None) is None or tab.generation != self.generation:
+                return
+            self._logs.pop(tab.handle, None)
+            self._dom_ready.pop(tab.handle, None)
+            try:
+                self._switch(tab.handle)
+                self.driver.close()
+            except Exception as e:
+                logger.debug(f"Error cerrando la pestaña: {e}")
+                self.handle_error(e)
+            finally:
+                self._current = None
+            if self.driver is not None and tab.context_id:
+                self._dispose_context(tab.context_id)
+
+    def _drain_logs(self, tab: 'TabDriver'):
+        """Reparte el log de performance de la sesión entre las pestañas (con `lock` tomado)"""
+        driver = self._activate(tab)
+        try:
+            entries = driver.get_log('performance')
+        except Exception as e:
+            self.handle_error(e)
+            raise
+        for entry in entries:
+            raw = entry.get('message', '')
+            try:
+                webview = json.loads(raw).get('webview')
+            except Exception:
+                continue
+            if webview not in self._tabs:
+                continue
+            if '"Page.domContentEventFired"' in raw:
+                self._dom_ready[webview] += 1
+            buffer = self._logs.get(webview)
+            if buffer is not None:
+                buffer.append(entry)
+
+    def read_logs(self, tab: 'TabDriver') -> List[Dict]:
+        with self.lock:
+            if tab.handle not in self._logs:
+                # Primera lectura: desde acá en adelante se guarda el log de esta pestaña
+                self._logs[tab.handle] = deque(maxlen=TAB_LOG_LIMIT)
+            self._drain_logs(tab)
+            buffer = self._logs[tab.handle]
+            entries = list(buffer)
+            buffer.clear()
+            return entries
+
+    def dom_ready_count(self, tab: 'TabDriver') -> int:
+        with self.lock:
+            self._drain_logs(tab)
+            return self._dom_ready.get(tab.handle, 0)
+
+    def browser_pid(self) -> Optional[int]:
+        try:
+            return self.driver.service.process.pid
+        except Exception:
+            return None
+
+    def tab_count(self) -> int:
+        with self.lock:
+            return len(self._tabs)
+
+    def rss_mb(self) -> Optional[float]:
+        """RSS de todo el árbol de procesos de Chrome (todas las pestañas)"""
+        pid = self.browser_pid()
+        rss = process_tree_rss(pid) if pid else None
+        return rss / (1024 * 1024) if rss is not None else None
+
+    def stats(self) -> Dict:
+        with self.lock:
+            rss_mb = self.rss_mb()
+            return {
+                'running': self.driver is not None,
+                'draining': self.draining,
+                'navigations': self.navigations,
+                'tabs': len(self._tabs),
+                'max_tabs': self.max_tabs,
+                'isolated_tabs': sum(1 for tab in self._tabs.values() if tab.context_id),
+                'launches': self.launches,
+                'tabs_opened': self.tabs_opened,
+                'window_switches': self.switches,
+                'rss_mb': round(rss_mb, 1) if rss_mb is not None else None,
+            }
+
+    def close(self):
+        with self.lock:
+            if self.driver is not None:
+                logger.info("🔒 Cerrando navegador compartido")
+            self._discard()
+
+
+class TabDriver:
+    """La parte de la API de WebDriver que usa el scraper, atada a una pestaña de SharedBrowser.
+
+    Si se activa `cancel`, la espera de la navegación en curso lanza ScrapeCancelled.
+    """
+
+    def __init__(self, browser: SharedBrowser, handle: str, context_id: Optional[str],
+                 cancel: Optional[threading.Event] = None):
+        self.browser = browser
+        self.handle = handle
+        self.context_id = context_id
+        self.cancel = cancel
+        self.generation = browser.generation
+
+    @property
+    def isolated(self) -> bool:
+        return self.context_id is not None
+
+    def _call(self, name: str, *args, **kwargs):
+        with self.browser.lock:
+            driver = self.browser._activate(self)
+            try:
+                return getattr(driver, name)(*args, **kwargs)
+            except Exception as e:
+                self.browser.handle_error(e)
+                raise
+
+    def execute_script(self, script: str, *args):
+        return self._call('execute_script', script, *args)
+
+    def execute_cdp_cmd(self, cmd: str, params: Dict):
+        return self._call('execute_cdp_cmd', cmd, params)
+
+    def get_cookies(self) -> List[Dict]:
+        return self._call('get_cookies')
+
+    def delete_all_cookies(self):
+        return self._call('delete_all_cookies')
+
+    @property
+    def page_source(self) -> str:
+        return self.execute_script('return document.documentElement ? document.documentElement.outerHTML : "";')
+
+    @property
+    def current_url(self) -> str:
+        return self.execute_script('return document.URL;')
+
+    def get_log(self, log_type: str) -> List[Dict]:
+        if log_type != 'performance':
+            return self._call('get_log', log_type)
+        return self.browser.read_logs(self)
+
+    def get(self, url: str):
+        """Como driver.get con page_load_strategy 'eager', sin retener la sesión mientras carga"""
+        if url == 'about:blank':
+            self._call('get', url)
+            return
+        with self.browser.lock:
+            self.browser.navigations += 1
+
+        try:
+            ready_before = self.browser.dom_ready_count(self)
+        except Exception as e:
+            if is_fatal_driver_error(e):
+                raise
+            ready_before = None
+
+        result = self.execute_cdp_cmd('Page.navigate', {'url': url}) or {}
+        if result.get('errorText'):
+            raise WebDriverException(f"unknown error: {result['errorText']}")
+
+        if ready_before is not None:
+            deadline = time.monotonic() + self.browser.navigation_timeout
+            while time.monotonic() < deadline:
+                if self.cancel is not None and self.cancel.is_set():
+                    raise ScrapeCancelled(f'Scrape cancelado durante la carga de {url}')
+                if self.browser.dom_ready_count(self) > ready_before:
+                    return
+                time.sleep(POLL_INTERVAL)
+            logger.debug(f"Sin DOMContentLoaded en el log tras {self.browser.navigation_timeout:.0f}s: {url}")
+
+        # Sin log de performance: chromedriver espera la navegación pendiente antes de correr el script
+        self.execute_script('return document.readyState;')
+
+    def quit(self):
+        self.browser.close_tab(self)
+
+    close = quit
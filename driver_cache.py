@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+from webdriver_manager.chrome import ChromeDriverManager
+try:
+    from webdriver_manager.core.utils import ChromeType
+except Exception:
+    try:
+        from webdriver_manager.utils import ChromeType
+    except Exception:
+        ChromeType = None
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PATH = os.environ.get(
+    'CHROMEDRIVER_CACHE',
+    os.path.join(tempfile.gettempdir(), 'video-downloader-chromedriver.json'),
+)
+
+_resolved: Optional[Tuple[str, Optional[str]]] = None
+_resolve_lock = threading.Lock()
+
+
+def _binary_fingerprint(chrome_bin: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(os.path.realpath(chrome_bin))
+    except OSError:
+        return None
+
+
+def detect_browser_version(chrome_bin: str) -> Optional[str]:
+    try:
+        out = subprocess.check_output([chrome_bin, '--version'], stderr=subprocess.STDOUT, text=True, timeout=15)
+        return out.strip()
+    except Exception:
+        logger.debug("Could not detect chrome binary version via subprocess")
+        return None
+
+
+def install_chromedriver() -> str:
+    """Descarga (o reutiliza) chromedriver con webdriver-manager, preferentemente para Chromium"""
+    try:
+        if ChromeType is not None:
+            return ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()
+        try:
+            return ChromeDriverManager(chrome_type='chromium').install()
+        except Exception:
+            return ChromeDriverManager().install()
+    except Exception as e:
+        logger.warning(f"webdriver-manager failed to install chromedriver with Chromium hint: {e}; falling back to default manager")
+        return ChromeDriverManager().install()
+
+
+def _load_cache() -> Dict:
+    try:
+        with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(data: Dict):
+    # Escritura atómica: varios workers pueden arrancar a la vez
+    directory = os.path.dirname(CACHE_PATH) or '.'
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.chromedriver-', suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, CACHE_PATH)
+    except OSError as e:
+        logger.debug(f"No se pudo guardar la cache de chromedriver: {e}")
+
+
+def resolve_chromedriver(chrome_bin: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """Ruta de chromedriver y versión del navegador, cacheadas en memoria y en disco.
+
+    La entrada en disco se invalida si cambia el binario de Chrome (ruta o
+    mtime) o si el chromedriver cacheado ya no existe.
+    """
+    global _resolved
+    with _resolve_lock:
+        if _resolved and os.path.exists(_resolved[0]):
+            return _resolved
+
+        chrome_bin = chrome_bin or os.environ.get('CHROME_BIN', '/usr/bin/chromium')
+        override = os.environ.get('CHROMEDRIVER_PATH')
+        if override:
+            _resolved = (override, detect_browser_version(chrome_bin))
+            return _resolved
+
+        fingerprint = _binary_fingerprint(chrome_bin)
+        cached = _load_cache()
+        if (
+            cached.get('chrome_bin') == chrome_bin
+            and cached.get('chrome_mtime') == fingerprint
+            and cached.get('driver_path')
+            and os.path.exists(cached['driver_path'])
+        ):
+            logger.info(f"Using cached chromedriver at: {cached['driver_path']}")
+            _resolved = (cached['driver_path'], cached.get('browser_version'))
+            return _resolved
+
+        browser_version = detect_browser_version(chrome_bin)
+        if browser_version:
+            logger.info(f"Detected browser version: {browser_version}")
+        driver_path = install_chromedriver()
+        logger.info(f"Using chromedriver at: {driver_path}")
+
+        _save_cache({
+            'chrome_bin': chrome_bin,
+            'chrome_mtime': fingerprint,
+            'browser_version': browser_version,
+            'driver_path': driver_path,
+        })
+        _resolved = (driver_path, browser_version)
+        return _resolved
+
+
+if __name__ == '__main__':
+    # Usado por start.sh para dejar resuelto chromedriver antes de arrancar la app
+    logging.basicConfig(level=logging.INFO)
+    try:
+        path, version = resolve_chromedriver()
+    except Exception as e:
+        print("webdriver-manager install failed:", e)
+        sys.exit(0)
+    print("CHROMEDRIVER_INSTALLED:" + str(path))
+    if version:
+        print("BROWSER_VERSION:" + version)
@@ -0,0 +1,164 @@
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Mensajes de WebDriver que indican que el navegador murió o perdió la sesión
+FATAL_DRIVER_ERRORS = (
+    'chrome not reachable',
+    'invalid session id',
+    'session deleted',
+    'no such window',
+    'target window already closed',
+    'tab crashed',
+    'disconnected',
+    'connection refused',
+    'max retries exceeded',
+)
+
+
+def is_fatal_driver_error(error) -> bool:
+    msg = str(error).lower()
+    return any(marker in msg for marker in FATAL_DRIVER_ERRORS)
+
+
+def process_tree_rss(root_pid: int) -> Optional[int]:
+    """RSS total (bytes) de un proceso y sus descendientes leyendo /proc; None fuera de Linux"""
+    try:
+        pids = [p for p in os.listdir('/proc') if p.isdigit()]
+    except OSError:
+        return None
+
+    children: Dict[int, List[int]] = defaultdict(list)
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'r') as f:
+                stat = f.read()
+            # El nombre del proceso va entre paréntesis y puede contener espacios
+            ppid = int(stat[stat.rindex(')') + 2:].split()[1])
+            children[ppid].append(int(pid))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f'/proc/{pid}/statm', 'r') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            pass
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class DriverLifecycle:
+    """Política de vida de los navegadores del pool.
+
+    - Reciclar tras `max_navigations` navegaciones o si el árbol de procesos
+      de Chrome supera `max_rss_mb`. Un Chrome compartido (modo tabs) se
+      recicla entero con esos límites multiplicados por sus pestañas.
+    - Relanzar y reintentar una vez si el navegador murió durante un scrape.
+    - Limpiar cookies y cache al devolver el navegador al pool.
+    """
+
+    def __init__(self, max_navigations: int = 200, max_rss_mb: float = 1024.0, reset_between_leases: bool = True):
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.reset_between_leases = reset_between_leases
+        self.recycled = 0
+        self.crash_restarts = 0
+
+    def run(self, scraper, method: str, *args, **kwargs) -> Dict:
+        """Ejecuta un método de scrape; si el navegador murió, lo relanza y reintenta una vez"""
+        scraper.crashed = False
+        result = getattr(scraper, method)(*args, **kwargs)
+        # Un intento cancelado (perdió el hedge) no se reintenta
+        if not scraper.crashed or scraper.cancel_event.is_set():
+            return result
+
+        logger.warning(f"💥 Navegador caído durante {method}; relanzando y reintentando")
+        self.crash_restarts += 1
+        scraper.restart_driver()
+        scraper.crashed = False
+        return getattr(scraper, method)(*args, **kwargs)
+
+    def browser_rss_mb(self, scraper) -> Optional[float]:
+        pid = scraper.browser_pid()
+        if not pid:
+            return None
+        rss = process_tree_rss(pid)
+        return rss / (1024 * 1024) if rss is not None else None
+
+    def browser_recycle_reason(self, browser) -> Optional[str]:
+        """Motivo para reciclar un Chrome compartido por navegaciones o RSS de todas sus pestañas"""
+        if browser.draining or browser.driver is None:
+            return None
+        if self.max_navigations and browser.navigations >= self.max_navigations * browser.max_tabs:
+            return f'{browser.navigations} navegaciones entre todas las pestañas'
+        if self.max_rss_mb:
+            rss_mb = browser.rss_mb()
+            if rss_mb is not None and rss_mb > self.max_rss_mb * browser.max_tabs:
+                return f'RSS {rss_mb:.0f} MB entre todas las pestañas'
+        return None
+
+    def on_release(self, scraper):
+        """Se llama al devolver el scraper al pool: recicla o limpia el estado de la sesión"""
+        if scraper.driver is None:
+            return
+
+        browser = scraper.browser
+        if browser is not None:
+            reason = self.browser_recycle_reason(browser)
+            if reason:
+                logger.info(f"♻️ Reciclando navegador compartido ({reason})")
+                self.recycled += 1
+                browser.draining = True
+            if browser.draining:
+                # Esta pestaña se reabre en otro Chrome (ver DriverPool.release)
+                scraper.close()
+                return
+
+        reason = None
+        if scraper.crashed:
+            reason = 'navegador caído'
+        elif self.max_navigations and scraper.navigations >= self.max_navigations:
+            reason = f'{scraper.navigations} navegaciones'
+        elif self.max_rss_mb:
+            rss_mb = self.browser_rss_mb(scraper)
+            if rss_mb is not None and rss_mb > self.max_rss_mb:
+                reason = f'RSS {rss_mb:.0f} MB'
+
+        if reason:
+            logger.info(f"♻️ Reciclando navegador ({reason})")
+            self.recycled += 1
+            scraper.close()
+            return
+
+        if self.reset_between_leases:
+            scraper.reset_session()
+            if scraper.crashed:
+                # Murió justo al limpiar: mejor cerrarlo ahora que en el próximo lease
+                self.recycled += 1
+                scraper.close()
+
+    def stats(self) -> Dict:
+        return {
+            'max_navigations': self.max_navigations,
+            'max_rss_mb': self.max_rss_mb,
+            'recycled': self.recycled,
+            'crash_restarts': self.crash_restarts,
+        }
+
+
+def lifecycle_from_env() -> DriverLifecycle:
+    return DriverLifecycle(
+        max_navigations=int(os.environ.get('SCRAPER_MAX_NAVIGATIONS', '200')),
+        max_rss_mb=float(os.environ.get('SCRAPER_MAX_RSS_MB', '1024')),
+        reset_between_leases=os.environ.get('SCRAPER_RESET_BETWEEN_LEASES', '1') not in ('0', 'false', 'no'),
+    )
@@ -0,0 +1,382 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from browser_tabs import SharedBrowser
+from driver_lifecycle import DriverLifecycle, lifecycle_from_env
+from scraper_selenium import FacebookSeleniumScraper
+
+logger = logging.getLogger(__name__)
+
+# process: un Chrome por scraper; tabs: varias pestañas aisladas por Chrome (ver browser_tabs)
+POOL_MODES = ('process', 'tabs')
+
+# Reintentos del precalentamiento que no llegó al objetivo: espera inicial y tope del backoff (segundos)
+WARM_RETRY_DELAY = float(os.environ.get('SCRAPER_PREWARM_RETRY_DELAY', '2'))
+WARM_RETRY_MAX_DELAY = float(os.environ.get('SCRAPER_PREWARM_RETRY_MAX_DELAY', '60'))
+
+
+class PoolTimeoutError(Exception):
+    """No hubo un driver libre dentro del tiempo de espera del lease"""
+
+
+class DriverPool:
+    """Pool acotado de scrapers con semántica lease/return.
+
+    En modo 'process' cada scraper tiene su propio Chrome; en modo 'tabs' cada
+    scraper es una pestaña con su propio browser context y hasta
+    `tabs_per_browser` pestañas comparten un Chrome.
+    """
+
+    def __init__(self, size: int = 2, headless: bool = True, lease_timeout: float = 30.0,
+                 lifecycle: Optional[DriverLifecycle] = None, mode: str = 'process', tabs_per_browser: int = 4):
+        if mode not in POOL_MODES:
+            raise ValueError(f"Modo de pool desconocido: {mode} (opciones: {', '.join(POOL_MODES)})")
+        self.size = max(1, size)
+        self.headless = headless
+        self.lease_timeout = lease_timeout
+        self.lifecycle = lifecycle or DriverLifecycle()
+        self.mode = mode
+        self.tabs_per_browser = max(1, tabs_per_browser)
+        self._browsers: List[SharedBrowser] = []
+
+        self._cond = threading.Condition()
+        self._idle: List[FacebookSeleniumScraper] = []
+        self._all: List[FacebookSeleniumScraper] = []
+        self._closed = False
+        self.warm_target = 0
+        # Navegadores reciclados o caídos que se están relanzando en segundo plano
+        self._relaunching = 0
+        self._warm_retrying = False
+
+        # Métricas
+        self._leases_total = 0
+        self._lease_timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._waiting = 0
+
+    def _create_scraper(self) -> FacebookSeleniumScraper:
+        # El driver se levanta de forma perezosa en el primer scrape
+        if self.mode == 'tabs':
+            return FacebookSeleniumScraper(headless=self.headless, browser=self._browser_for_new_scraper())
+        return FacebookSeleniumScraper(headless=self.headless)
+
+    def _browser_for_new_scraper(self) -> SharedBrowser:
+        """Primer Chrome compartido con lugar libre; si no hay, uno nuevo (con `_cond` tomado)"""
+        for browser in self._browsers:
+            if browser.draining:
+                continue
+            assigned = sum(1 for scraper in self._all if scraper.browser is browser)
+            if assigned < self.tabs_per_browser:
+                return browser
+        browser = SharedBrowser(headless=self.headless, max_tabs=self.tabs_per_browser)
+        self._browsers.append(browser)
+        return browser
+
+    def acquire(self, timeout: Optional[float] = None) -> FacebookSeleniumScraper:
+        if timeout is None:
+            timeout = self.lease_timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("El pool de drivers está cerrado")
+                    if self._idle:
+                        scraper = self._idle.pop()
+                        break
+                    if len(self._all) < self.size:
+                        scraper = self._create_scraper()
+                        self._all.append(scraper)
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._lease_timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No hay drivers libres tras {timeout:.1f}s (pool de {self.size})"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            # La cancelación vale por lease: se limpia al entregarlo, no al empezar el scrape
+            scraper.cancel_event.clear()
+            waited = time.monotonic() - start
+            self._leases_total += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            return scraper
+
+    def try_acquire(self) -> Optional[FacebookSeleniumScraper]:
+        """Lease sin espera: un scraper libre (o uno nuevo si el pool no está lleno) o None"""
+        with self._cond:
+            if self._closed:
+                return None
+            if self._idle:
+                scraper = self._idle.pop()
+            elif len(self._all) < self.size:
+                scraper = self._create_scraper()
+                self._all.append(scraper)
+            else:
+                return None
+            scraper.cancel_event.clear()
+            self._leases_total += 1
+            return scraper
+
+    def release(self, scraper: FacebookSeleniumScraper):
+        had_driver = scraper.driver is not None
+        try:
+            self.lifecycle.on_release(scraper)
+        except Exception as e:
+            logger.warning(f"Error en el ciclo de vida del navegador: {e}")
+        # El ciclo de vida cerró el navegador (reciclado o caído): se reemplaza antes del próximo lease
+        relaunch = had_driver and scraper.driver is None
+        drained: List[FacebookSeleniumScraper] = []
+
+        with self._cond:
+            if self._closed or scraper not in self._all:
+                close_now = True
+                relaunch = False
+            else:
+                close_now = False
+                if scraper.browser is not None and scraper.browser.draining:
+                    drained = self._move_off_draining_browsers(scraper)
+                if relaunch:
+                    self._relaunching += 1
+                else:
+                    self._idle.append(scraper)
+            self._cond.notify()
+
+        if close_now:
+            try:
+                scraper.close()
+            except Exception:
+                pass
+        if relaunch:
+            threading.Thread(target=self._relaunch, args=(scraper,), daemon=True).start()
+        for idle in drained:
+            idle.close()
+            threading.Thread(target=self._relaunch, args=(idle,), daemon=True).start()
+        if self.mode == 'tabs':
+            self._retire_drained_browsers()
+
+    def _move_off_draining_browsers(self, scraper: FacebookSeleniumScraper) -> List[FacebookSeleniumScraper]:
+        """Reasigna a otro Chrome el scraper devuelto y los libres de navegadores en reciclaje (con `_cond` tomado).
+
+        Devuelve los libres que tenían una pestaña abierta: hay que cerrarla y reabrirla en el nuevo navegador.
+        """
+        scraper.browser = self._browser_for_new_scraper()
+        drained = []
+        for idle in list(self._idle):
+            if idle.browser is None or not idle.browser.draining:
+                continue
+            idle.browser = self._browser_for_new_scraper()
+            if idle.driver is not None:
+                self._idle.remove(idle)
+                drained.append(idle)
+        self._relaunching += len(drained)
+        return drained
+
+    def _retire_drained_browsers(self):
+        """Cierra los Chrome en reciclaje que ya no tienen pestañas"""
+        with self._cond:
+            draining = [browser for browser in self._browsers if browser.draining]
+        # tab_count toma el lock del navegador: fuera de `_cond` para no frenar los leases
+        empty = [browser for browser in draining if browser.tab_count() == 0]
+        if not empty:
+            return
+        with self._cond:
+            for browser in empty:
+                if browser in self._browsers:
+                    self._browsers.remove(browser)
+        for browser in empty:
+            browser.close()
+
+    def _relaunch(self, scraper: FacebookSeleniumScraper):
+        """Lanza el reemplazo fuera del camino del request; si falla, queda perezoso como antes"""
+        try:
+            scraper.setup_driver()
+        except Exception as e:
+            logger.error(f"❌ No se pudo relanzar el navegador reciclado: {e}")
+        with self._cond:
+            self._relaunching -= 1
+            keep = not self._closed and scraper in self._all
+            if keep:
+                self._idle.append(scraper)
+            self._cond.notify()
+        if not keep:
+            scraper.close()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        scraper = self.acquire(timeout)
+        try:
+            yield scraper
+        finally:
+            self.release(scraper)
+
+    def run(self, method: str, *args, timeout: Optional[float] = None, **kwargs):
+        """Lease + método de scrape con recuperación ante caídas del navegador"""
+        with self.lease(timeout) as scraper:
+            return self.lifecycle.run(scraper, method, *args, **kwargs)
+
+    def warm(self, count: int) -> int:
+        """Lanza hasta `count` navegadores en paralelo y los deja libres en el pool.
+
+        Devuelve cuántos quedaron listos; los fallos se registran pero no se propagan.
+        Si faltan navegadores, se reintenta en segundo plano con backoff hasta
+        llegar al objetivo, así /ready no queda en 503 por un fallo pasajero.
+        """
+        with self._cond:
+            self.warm_target = min(max(0, count), self.size)
+        warm = self._warm_once()
+        logger.info(f"🔥 Pool precalentado: {warm}/{self.warm_target} navegadores listos")
+        if warm < self.warm_target:
+            with self._cond:
+                start = not self._warm_retrying and not self._closed
+                self._warm_retrying = True
+            if start:
+                threading.Thread(target=self._retry_warm, daemon=True).start()
+        return warm
+
+    def _retry_warm(self):
+        delay = WARM_RETRY_DELAY
+        try:
+            while True:
+                time.sleep(delay)
+                with self._cond:
+                    if self._closed:
+                        return
+                if self._warm_once() >= self.warm_target:
+                    logger.info(f"🔥 Precalentamiento completado en segundo plano ({self.warm_target} navegadores)")
+                    return
+                delay = min(WARM_RETRY_MAX_DELAY, delay * 2)
+                logger.warning(f"🔥 Precalentamiento incompleto; reintento en {delay:.0f}s")
+        finally:
+            with self._cond:
+                self._warm_retrying = False
+
+    def _warm_once(self) -> int:
+        """Lanza los navegadores que faltan para `warm_target` y devuelve cuántos hay listos"""
+        with self._cond:
+            warm = sum(1 for scraper in self._all if scraper.driver is not None)
+            missing = self.warm_target - warm - self._relaunching
+            pending = []
+            # Primero los libres sin navegador (p. ej. un relanzamiento fallido), después scrapers nuevos
+            for scraper in [s for s in self._idle if s.driver is None][:max(0, missing)]:
+                self._idle.remove(scraper)
+                pending.append(scraper)
+            while len(pending) < missing and len(self._all) < self.size:
+                scraper = self._create_scraper()
+                self._all.append(scraper)
+                pending.append(scraper)
+
+        def launch(scraper: FacebookSeleniumScraper):
+            try:
+                scraper.setup_driver()
+                ok = True
+            except Exception as e:
+                logger.error(f"❌ No se pudo precalentar un navegador: {e}")
+                ok = False
+            with self._cond:
+                keep = ok and not self._closed
+                if keep:
+                    self._idle.append(scraper)
+                elif scraper in self._all:
+                    self._all.remove(scraper)
+                self._cond.notify()
+            if ok and not keep:
+                scraper.close()
+
+        threads = [threading.Thread(target=launch, args=(scraper,), daemon=True) for scraper in pending]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.warm_count()
+
+    def warm_count(self) -> int:
+        with self._cond:
+            return sum(1 for scraper in self._all if scraper.driver is not None)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            in_use = len(self._all) - len(self._idle)
+            browsers = list(self._browsers)
+            stats = {
+                'size': self.size,
+                'created': len(self._all),
+                'warm': sum(1 for scraper in self._all if scraper.driver is not None),
+                'warm_target': self.warm_target,
+                'relaunching': self._relaunching,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'waiting': self._waiting,
+                'utilization': round(in_use / self.size, 3),
+                'leases_total': self._leases_total,
+                'lease_timeouts': self._lease_timeouts,
+                'avg_wait_ms': round(1000 * self._wait_total / self._leases_total, 2) if self._leases_total else 0.0,
+                'max_wait_ms': round(1000 * self._wait_max, 2),
+                'lifecycle': self.lifecycle.stats(),
+                'mode': self.mode,
+            }
+        # browser.stats() toma el lock del navegador (ocupado mientras arranca Chrome o corre un comando)
+        # y recorre /proc: fuera de `_cond` para que /health y /metrics no frenen los leases
+        stats['browsers'] = [browser.stats() for browser in browsers]
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            scrapers = list(self._all)
+            browsers = list(self._browsers)
+            self._all.clear()
+            self._idle.clear()
+            self._browsers.clear()
+            self._cond.notify_all()
+
+        for scraper in scrapers:
+            try:
+                scraper.close()
+            except Exception as e:
+                logger.warning(f"Error cerrando driver del pool: {e}")
+        for browser in browsers:
+            try:
+                browser.close()
+            except Exception as e:
+                logger.warning(f"Error cerrando navegador compartido: {e}")
+
+
+# Pool compartido por todos los endpoints
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+
+def get_driver_pool(headless: bool = True) -> DriverPool:
+    global _driver_pool
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            size = int(os.environ.get('SCRAPER_POOL_SIZE', '2'))
+            lease_timeout = float(os.environ.get('SCRAPER_LEASE_TIMEOUT', '30'))
+            mode = os.environ.get('SCRAPER_POOL_MODE', 'process').strip().lower()
+            tabs_per_browser = int(os.environ.get('SCRAPER_TABS_PER_BROWSER', '4'))
+            _driver_pool = DriverPool(size=size, headless=headless, lease_timeout=lease_timeout,
+                                      lifecycle=lifecycle_from_env(), mode=mode, tabs_per_browser=tabs_per_browser)
+            logger.info(f"🚗 Pool de drivers creado (tamaño {size}, modo {mode})")
+        return _driver_pool
+
+
+def close_driver_pool():
+    global _driver_pool
+    with _driver_pool_lock:
+        pool = _driver_pool
+        _driver_pool = None
+    if pool:
+        pool.close()
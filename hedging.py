@@ -0,0 +1,251 @@
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from driver_pool import DriverPool
+from metrics import HEDGES_TOTAL
+from scheduler import HIGH, get_scheduler
+from throttle import get_throttle
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Duraciones recientes de un método de scrape; el umbral de hedge es un percentil de ellas"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+        return ordered[min(rank, len(ordered)) - 1]
+
+
+class Hedger:
+    """Segundo intento en otro navegador cuando el primero tarda más de lo habitual.
+
+    - El umbral es el percentil `percentile` de las duraciones recientes de ese
+      método (con menos de `min_samples` se usa `default_delay`), nunca menor a
+      `min_delay`.
+    - Sólo se lanza si hay un navegador libre en el pool y turno libre en el
+      scheduler y en el control adaptativo: un hedge nunca hace esperar a
+      otro pedido y cuenta como un pedido más a Facebook. Esos turnos extra se
+      devuelven cuando termina el último intento en curso, así siguen a los
+      navegadores realmente ocupados.
+    - Presupuesto tipo token bucket: cada pedido suma `max_ratio` tokens y cada
+      hedge gasta uno, así los hedges no pasan de esa fracción del tráfico.
+    - Gana el primer resultado exitoso; el otro intento se cancela en su
+      próxima espera (carga de una pestaña en modo tabs, PageReadiness,
+      captura de red o sondeo de candidatos) y su navegador vuelve al pool.
+      En modo process la carga misma (driver.get) no se puede cortar.
+    """
+
+    def __init__(self, percentile: float = 90.0, max_ratio: float = 0.1, min_delay: float = 1.0,
+                 default_delay: float = 10.0, min_samples: int = 20, burst: float = 5.0):
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self._tokens = 0.0
+
+        # Métricas
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped_budget = 0
+        self.skipped_no_browser = 0
+        self.skipped_scheduler = 0
+        self.skipped_throttle = 0
+
+    def _tracker(self, method: str) -> LatencyTracker:
+        tracker = self._trackers.get(method)
+        if tracker is None:
+            tracker = self._trackers[method] = LatencyTracker()
+        return tracker
+
+    def delay(self, method: str) -> float:
+        with self._lock:
+            tracker = self._tracker(method)
+            if len(tracker) < self.min_samples:
+                return max(self.min_delay, self.default_delay)
+            return max(self.min_delay, tracker.percentile(self.percentile))
+
+    def _observe(self, method: str, seconds: float):
+        with self._lock:
+            self._tracker(method).observe(seconds)
+
+    def _skip(self, method: str, outcome: str):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        HEDGES_TOTAL.inc(method=method, outcome=outcome)
+
+    def _try_hedge(self, pool: DriverPool, method: str):
+        """Navegador libre + turnos + token de presupuesto, o None (y el motivo queda en las métricas)"""
+        with self._lock:
+            if self._tokens < 1:
+                self._skip(method, 'skipped_budget')
+                return None
+            scheduler = get_scheduler()
+            if not scheduler.try_acquire(HIGH):
+                self._skip(method, 'skipped_scheduler')
+                return None
+            throttle = get_throttle()
+            if throttle is not None and not throttle.try_acquire():
+                scheduler.release(HIGH)
+                self._skip(method, 'skipped_throttle')
+                return None
+            scraper = pool.try_acquire()
+            if scraper is None:
+                if throttle is not None:
+                    throttle.release()
+                scheduler.release(HIGH)
+                self._skip(method, 'skipped_no_browser')
+                return None
+            self._tokens -= 1
+            self.hedged += 1
+            return scraper
+
+    def run(self, pool: DriverPool, method: str, *args, **kwargs) -> Dict:
+        """Como pool.run(method, ...) pero con hedge"""
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self.burst, self._tokens + self.max_ratio)
+
+        results: queue.Queue = queue.Queue()
+        attempts = {}
+        # Intentos todavía corriendo y si hay turnos extra del hedge; se devuelven con el último
+        running = {'count': 0, 'extra_slot': False, 'released': set()}
+        running_lock = threading.Lock()
+
+        def finish():
+            with running_lock:
+                running['count'] -= 1
+                last = running['count'] == 0 and running['extra_slot']
+                if last:
+                    running['extra_slot'] = False
+            if last:
+                throttle = get_throttle()
+                if throttle is not None:
+                    throttle.release()
+                get_scheduler().release(HIGH)
+
+        def attempt(name: str, scraper):
+            start = time.monotonic()
+            try:
+                result = pool.lifecycle.run(scraper, method, *args, **kwargs)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            finally:
+                # Desde acá el scraper puede ir a otro pedido: ya no se le puede cancelar
+                with running_lock:
+                    running['released'].add(name)
+                pool.release(scraper)
+                finish()
+            results.put((name, result, time.monotonic() - start))
+
+        def launch(name: str, scraper):
+            with running_lock:
+                attempts[name] = (scraper, time.monotonic())
+                running['count'] += 1
+                if name == 'hedge':
+                    running['extra_slot'] = True
+            # Cada intento corre con una copia del contexto para que sus spans lleguen al trace del request
+            ctx = contextvars.copy_context()
+            threading.Thread(target=ctx.run, args=(attempt, name, scraper), daemon=True).start()
+
+        # El lease del primer intento se pide en este hilo: PoolTimeoutError se propaga como en pool.run
+        launch('primary', pool.acquire())
+        delay = self.delay(method)
+        try:
+            outcome = results.get(timeout=delay)
+        except queue.Empty:
+            scraper = self._try_hedge(pool, method)
+            if scraper is not None:
+                logger.info(f"🏇 Hedge de {method}: el primer intento superó {delay:.1f}s")
+                launch('hedge', scraper)
+            outcome = results.get()
+
+        finished = [outcome]
+        # Si el primero en terminar falló y el otro sigue, vale la pena esperarlo
+        while not outcome[1].get('success') and len(finished) < len(attempts):
+            outcome = results.get()
+            finished.append(outcome)
+        # Si fallaron todos se devuelve el primer error, igual que sin hedge
+        winner = outcome if outcome[1].get('success') else finished[0]
+
+        now = time.monotonic()
+        done = {name: elapsed for name, _, elapsed in finished}
+        with running_lock:
+            for name, (scraper, started) in attempts.items():
+                if name not in running['released']:
+                    scraper.cancel_event.set()
+        # Un primario cancelado aporta una duración censurada: al menos lo que llevaba
+        self._observe(method, done.get('primary', now - attempts['primary'][1]))
+
+        if 'hedge' in attempts:
+            won = winner[0] == 'hedge'
+            if won:
+                with self._lock:
+                    self.hedge_wins += 1
+            HEDGES_TOTAL.inc(method=method, outcome='won' if won else 'lost')
+        return winner[1]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            delays = {}
+            for method, tracker in self._trackers.items():
+                delays[method] = {
+                    'samples': len(tracker),
+                    'p50_ms': round(1000 * (tracker.percentile(50) or 0), 2),
+                    f'p{self.percentile:g}_ms': round(1000 * (tracker.percentile(self.percentile) or 0), 2),
+                }
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'hedge_rate': round(self.hedged / self.requests, 4) if self.requests else 0.0,
+                'max_ratio': self.max_ratio,
+                'skipped_budget': self.skipped_budget,
+                'skipped_no_browser': self.skipped_no_browser,
+                'skipped_scheduler': self.skipped_scheduler,
+                'skipped_throttle': self.skipped_throttle,
+                'tokens': round(self._tokens, 3),
+                'methods': delays,
+            }
+
+
+# Hedge opcional para /scrape y /scrape/video (prioridad HIGH)
+HEDGING_ENABLED = os.environ.get('SCRAPER_HEDGE', '0') not in ('0', 'false', 'no', '')
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger(
+                percentile=float(os.environ.get('SCRAPER_HEDGE_PERCENTILE', '90')),
+                max_ratio=float(os.environ.get('SCRAPER_HEDGE_MAX_RATIO', '0.1')),
+                min_delay=float(os.environ.get('SCRAPER_HEDGE_MIN_DELAY', '1')),
+                default_delay=float(os.environ.get('SCRAPER_HEDGE_DEFAULT_DELAY', '10')),
+            )
+        return _hedger
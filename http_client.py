@@ -0,0 +1,40 @@
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+MOBILE_USER_AGENT = (
+    "Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36"
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Sesión HTTP compartida con conexiones keep-alive reutilizables entre threads"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = int(os.environ.get('HTTP_POOL_SIZE', '32'))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({"User-Agent": DEFAULT_USER_AGENT})
+            # Las cookies se pasan por request; la sesión compartida no guarda las de respuesta
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _session = session
+        return _session
+
+
+def close_http_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,233 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import scrape_service
+from driver_pool import get_driver_pool
+from scheduler import LOW
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """La cola de jobs no admite más URLs; retry_after estima cuándo volver a intentar"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """Lote de URLs del mismo tipo; los resultados se llenan a medida que terminan"""
+
+    def __init__(self, job_type: str, urls: List[str]):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.urls = urls
+        self.results: List[Optional[Dict]] = [None] * len(urls)
+        self.completed = 0
+        self.failed = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return 'done'
+        return 'running' if self.started_at is not None else 'queued'
+
+    def to_dict(self, include_results: bool = True) -> Dict:
+        total = len(self.urls)
+        data = {
+            'job_id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'total': total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'progress': round((self.completed + self.failed) / total, 3) if total else 1.0,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if include_results:
+            data['results'] = [
+                dict(result, index=idx, url=self.urls[idx])
+                for idx, result in enumerate(self.results) if result is not None
+            ]
+        return data
+
+
+class JobManager:
+    """Cola acotada de URLs procesada por hilos de fondo.
+
+    La cota es en URLs pendientes (no en jobs) porque eso es lo que ocupa
+    navegadores. Si un job no entra, submit() levanta JobQueueFull con una
+    estimación de espera basada en la duración media de cada URL.
+    """
+
+    def __init__(self, runners: Dict[str, Callable[[str], Dict]], workers: int = 2,
+                 max_pending: int = 1000, retention: float = 3600.0, max_jobs: int = 1000):
+        self.runners = runners
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.retention = retention
+        self.max_jobs = max(1, max_jobs)
+
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending = 0
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+
+        # Métricas
+        self.submitted = 0
+        self.rejected = 0
+        self._avg_item_seconds = 5.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+            logger.info(f"🧵 {self.workers} worker(s) de jobs iniciados")
+
+    def _retry_after(self) -> int:
+        # Segundos hasta vaciar lo pendiente al ritmo actual (con el lock tomado)
+        estimate = self._pending * self._avg_item_seconds / self.workers
+        return int(min(300, max(1, estimate)))
+
+    def submit(self, job_type: str, urls: List[str]) -> Job:
+        if job_type not in self.runners:
+            raise ValueError(f"Tipo de job desconocido: {job_type}")
+        if len(urls) > self.max_pending:
+            # Nunca entraría en la cola: reintentar más tarde no tiene sentido
+            raise ValueError(f"El job supera el máximo de {self.max_pending} URLs pendientes")
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("El gestor de jobs está cerrado")
+            if self._pending + len(urls) > self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(
+                    f"Cola de jobs llena ({self._pending}/{self.max_pending} URLs pendientes)",
+                    retry_after=self._retry_after(),
+                )
+            self._purge()
+            job = Job(job_type, urls)
+            self._jobs[job.id] = job
+            self._pending += len(urls)
+            self.submitted += 1
+
+        for idx in range(len(urls)):
+            self._queue.put((job, idx))
+        self.start()
+        logger.info(f"📦 Job {job.id} encolado: {len(urls)} URL(s) de tipo {job_type}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _purge(self):
+        # Se llama con el lock tomado: descarta jobs terminados viejos y, si sobran, los más antiguos
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            expired = job.finished_at is not None and now - job.finished_at > self.retention
+            if expired or (len(self._jobs) >= self.max_jobs and job.finished_at is not None):
+                del self._jobs[job_id]
+
+    def _run_item(self, job: Job, idx: int):
+        url = job.urls[idx]
+        start = time.monotonic()
+        try:
+            result = self.runners[job.type](url)
+        except Exception as e:
+            logger.warning(f"Error en job {job.id} ({url}): {e}")
+            result = {'success': False, 'error': str(e)}
+        elapsed = time.monotonic() - start
+
+        with self._lock:
+            job.results[idx] = result
+            if result.get('success'):
+                job.completed += 1
+            else:
+                job.failed += 1
+            if job.completed + job.failed == len(job.urls):
+                job.finished_at = time.time()
+                logger.info(f"✅ Job {job.id} terminado ({job.completed} ok, {job.failed} con error)")
+            self._pending -= 1
+            self._avg_item_seconds = 0.9 * self._avg_item_seconds + 0.1 * elapsed
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job, idx = item
+            with self._lock:
+                if job.started_at is None:
+                    job.started_at = time.time()
+            self._run_item(job, idx)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'jobs': len(self._jobs),
+                'active_jobs': sum(1 for job in self._jobs.values() if job.finished_at is None),
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'avg_item_seconds': round(self._avg_item_seconds, 3),
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+            self._threads.clear()
+        for _ in threads:
+            self._queue.put(None)
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            workers = int(os.environ.get('JOBS_WORKERS', '0')) or get_driver_pool(headless=True).size
+            _job_manager = JobManager(
+                runners={
+                    # Los lotes nunca le quitan el turno a un pedido interactivo
+                    'post': lambda url: scrape_service.scrape_post(url, blocking_profile='post-text', priority=LOW),
+                    'video': lambda url: scrape_service.scrape_video(url, blocking_profile='video', priority=LOW),
+                },
+                workers=workers,
+                max_pending=int(os.environ.get('JOBS_MAX_PENDING', '1000')),
+                retention=float(os.environ.get('JOBS_RETENTION', '3600')),
+            )
+        return _job_manager
+
+
+def close_job_manager():
+    global _job_manager
+    with _job_manager_lock:
+        manager = _job_manager
+        _job_manager = None
+    if manager:
+        manager.close()
@@ -1,13 +1,40 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field, validator
+from typing import List
+import json
 import logging
-from scraper_selenium import get_scraper_instance, close_scraper_instance
+import os
+import time
+from urllib.parse import urlparse
+from driver_pool import get_driver_pool, close_driver_pool, PoolTimeoutError
+from http_client import close_http_session
+import scrape_service
+import video_proxy
+from media_cache import get_media_cache, parse_range_header
+from result_store import get_result_store
+from singleflight import SingleFlightTimeout
+from jobs import get_job_manager, close_job_manager, JobQueueFull
+from scheduler import get_scheduler
+from hedging import HEDGING_ENABLED, get_hedger
+from throttle import ThrottleTimeout, get_throttle
+from url_canon import get_redirect_table, is_facebook_url
+import metrics
 import atexit
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Hosts aceptados además de los de Facebook (p. ej. el servidor de bench/ en 127.0.0.1)
+ALLOWED_HOSTS = {h.strip().lower() for h in os.environ.get('SCRAPER_ALLOWED_HOSTS', '').split(',') if h.strip()}
+
+
+def is_supported_url(url: str) -> bool:
+    if is_facebook_url(url):
+        return True
+    return bool(ALLOWED_HOSTS) and (urlparse(url).hostname or '') in ALLOWED_HOSTS
+
 app = FastAPI(
     title="Facebook Selenium Scraper API",
     description="API para scrapear Facebook usando Selenium (sin login)",
@@ -23,28 +50,85 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # La plantilla de la ruta (no la URL concreta) para no explotar la cardinalidad
+        route = request.scope.get('route')
+        endpoint = getattr(route, 'path', 'unmatched')
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        metrics.REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=str(status))
+
+
+def _run_traced(debug: bool, fn, *args, **kwargs):
+    """Ejecuta un scrape; con debug agrega al resultado el tiempo de cada etapa"""
+    if not debug:
+        return fn(*args, **kwargs)
+    start = time.perf_counter()
+    with metrics.trace() as spans:
+        result = fn(*args, **kwargs)
+    return dict(result, timings={'total_ms': round(1000 * (time.perf_counter() - start), 2), 'stages': spans})
+
+
 class PostURLRequest(BaseModel):
     url: str = Field(..., description="URL completa del post de Facebook")
     
     @validator('url')
     def validate_facebook_url(cls, v):
-        if 'facebook.com' not in v.lower():
+        if not is_supported_url(v):
             raise ValueError('La URL debe ser de Facebook')
         return v
 
 
 class PageRequest(BaseModel):
     page_url: str = Field(..., description="URL o nombre de la página")
-    num_posts: int = Field(default=10, ge=1, le=20, description="Número de posts")
+    num_posts: int = Field(default=10, ge=1, le=200, description="Número de posts")
+    stream: bool = Field(default=False, description="Emitir cada post como NDJSON apenas esté listo")
+
+
+class JobRequest(BaseModel):
+    urls: List[str] = Field(..., min_items=1, max_items=500, description="URLs de posts de Facebook")
+    type: str = Field(default='post', description="Tipo de job: post o video")
+
+    @validator('urls', each_item=True)
+    def validate_facebook_urls(cls, v):
+        if not is_supported_url(v):
+            raise ValueError('La URL debe ser de Facebook')
+        return v
+
+    @validator('type')
+    def validate_type(cls, v):
+        if v not in ('post', 'video'):
+            raise ValueError("El tipo debe ser 'post' o 'video'")
+        return v
+
+
+# Precalentar navegadores antes de aceptar tráfico
+@app.on_event("startup")
+def startup_event():
+    prewarm = int(os.environ.get('SCRAPER_PREWARM', '1'))
+    if prewarm > 0:
+        logger.info(f"🔥 Precalentando {prewarm} navegador(es)...")
+        get_driver_pool(headless=True).warm(prewarm)
 
 
 # Cerrar scraper al apagar la aplicación
 @app.on_event("shutdown")
 def shutdown_event():
-    logger.info("🔄 Cerrando scraper...")
-    close_scraper_instance()
+    logger.info("🔄 Cerrando pool de drivers...")
+    close_job_manager()
+    close_driver_pool()
+    close_http_session()
 
-atexit.register(close_scraper_instance)
+atexit.register(close_job_manager)
+atexit.register(close_driver_pool)
+atexit.register(close_http_session)
 
 
 @app.get("/")
@@ -58,25 +142,98 @@ def root():
             "POST /scrape": "Scrapear un post por URL",
             "GET /scrape?url=...": "Scrapear un post (GET)",
             "POST /scrape/images-only": "Solo URLs de imágenes",
-            "POST /scrape/page": "Scrapear múltiples posts de una página",
+            "POST /scrape/page": "Scrapear múltiples posts de una página (stream=true para NDJSON)",
             "GET /scrape/video?url=...": "URL del video (GET)",
             "POST /scrape/video": "URL del video (POST)",
-            "GET /health": "Health check"
+            "GET /download/video?url=...": "Descarga del video vía proxy (soporta Range)",
+            "POST /jobs": "Encolar un lote de URLs (post o video)",
+            "GET /jobs/{id}": "Progreso y resultados parciales de un job",
+            "GET /health": "Health check",
+            "GET /metrics": "Métricas en formato Prometheus",
+            "GET /ready": "Readiness (navegadores precalentados)"
         }
     }
 
 
 @app.get("/health")
 def health():
-    return {"status": "healthy", "version": "3.0.0", "scraper": "Selenium"}
+    return {
+        "status": "healthy",
+        "version": "3.0.0",
+        "scraper": "Selenium",
+        "pool": get_driver_pool(headless=True).stats(),
+        "cache": scrape_service.get_result_cache().stats(),
+        "store": get_result_store().stats() if get_result_store() else None,
+        "inflight": scrape_service.get_inflight().stats(),
+        "scheduler": get_scheduler().stats(),
+        "jobs": get_job_manager().stats(),
+        "hedging": get_hedger().stats() if HEDGING_ENABLED else None,
+        "throttle": get_throttle().stats() if get_throttle() else None,
+        "redirects": get_redirect_table().stats(),
+        "media_cache": get_media_cache().stats() if get_media_cache() else None
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    pool = get_driver_pool(headless=True).stats()
+    caches = [('memory', scrape_service.get_result_cache().stats())]
+    if get_result_store():
+        caches.append(('store', get_result_store().stats()))
+    if get_media_cache():
+        caches.append(('media', get_media_cache().stats()))
+    scheduler = get_scheduler().stats()
+    jobs = get_job_manager().stats()
+
+    lines = []
+    lines += metrics.gauge_lines('scraper_pool_browsers', 'Navegadores del pool por estado', [
+        ({'state': 'in_use'}, pool['in_use']),
+        ({'state': 'idle'}, pool['idle']),
+        ({'state': 'warm'}, pool['warm']),
+    ])
+    lines += metrics.gauge_lines('scraper_pool_utilization', 'Fracción del pool en uso', [({}, pool['utilization'])])
+    lines += metrics.gauge_lines('scraper_pool_waiting', 'Llamadores esperando un navegador', [({}, pool['waiting'])])
+    lines += metrics.gauge_lines('scraper_shared_browser_tabs', 'Pestañas abiertas por Chrome compartido (modo tabs)',
+                                 [({'browser': str(i)}, b['tabs']) for i, b in enumerate(pool['browsers'])])
+    lines += metrics.gauge_lines('scraper_shared_browser_rss_mb', 'RSS de cada Chrome compartido (modo tabs)',
+                                 [({'browser': str(i)}, b['rss_mb']) for i, b in enumerate(pool['browsers'])])
+    lines += metrics.gauge_lines('scraper_cache_hit_rate', 'Tasa de aciertos por cache',
+                                 [({'cache': name}, stats['hit_rate']) for name, stats in caches])
+    lines += metrics.gauge_lines('scraper_cache_entries', 'Entradas por cache',
+                                 [({'cache': name}, stats['entries']) for name, stats in caches])
+    lines += metrics.gauge_lines('scraper_scheduler_queue_depth', 'Pedidos esperando turno por prioridad',
+                                 [({'priority': p}, st['waiting']) for p, st in scheduler.items()])
+    lines += metrics.gauge_lines('scraper_scheduler_active', 'Pedidos en curso por prioridad',
+                                 [({'priority': p}, st['active']) for p, st in scheduler.items()])
+    lines += metrics.gauge_lines('scraper_jobs_pending_urls', 'URLs pendientes en la cola de jobs', [({}, jobs['pending'])])
+    throttle = get_throttle().stats() if get_throttle() else None
+    if throttle:
+        lines += metrics.gauge_lines('scraper_throttle_concurrency_limit', 'Concurrencia actual del control adaptativo',
+                                     [({}, throttle['concurrency_limit'])])
+        lines += metrics.gauge_lines('scraper_throttle_rate_limit', 'Tasa actual del control adaptativo (req/s)',
+                                     [({}, throttle['rate_limit'])])
+    lines += metrics.gauge_lines('scraper_inflight', 'Scrapes únicos en curso (single-flight)',
+                                 [({}, scrape_service.get_inflight().stats()['in_flight'])])
+    return PlainTextResponse(metrics.render(lines), media_type='text/plain; version=0.0.4')
+
+
+@app.get("/ready")
+def ready():
+    stats = get_driver_pool(headless=True).stats()
+    # Un navegador reciclado que se está relanzando sigue contando como capacidad
+    is_ready = stats['warm'] + stats['relaunching'] >= stats['warm_target']
+    body = {"ready": is_ready, "warm": stats['warm'], "relaunching": stats['relaunching'],
+            "warm_target": stats['warm_target'], "size": stats['size']}
+    if not is_ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
 
 
 @app.post("/scrape")
-def scrape_post(request: PostURLRequest):
+def scrape_post(request: PostURLRequest, debug: bool = Query(False, description="Incluir los tiempos de cada etapa")):
     try:
         logger.info(f"📬 POST /scrape - URL: {request.url}")
-        scraper = get_scraper_instance(headless=True)
-        result = scraper.scrape_post_by_url(request.url)
+        result = _run_traced(debug, scrape_service.scrape_post, request.url, blocking_profile='post-text')
         
         if not result['success']:
             raise HTTPException(
@@ -88,21 +245,24 @@ def scrape_post(request: PostURLRequest):
         
     except HTTPException:
         raise
+    except (PoolTimeoutError, ThrottleTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/scrape")
-def scrape_get(url: str = Query(..., description="URL del post de Facebook")):
+def scrape_get(url: str = Query(..., description="URL del post de Facebook"), debug: bool = Query(False, description="Incluir los tiempos de cada etapa")):
     try:
         logger.info(f"📬 GET /scrape - URL: {url}")
         
-        if 'facebook.com' not in url.lower():
+        if not is_supported_url(url):
             raise HTTPException(status_code=400, detail="Debe ser URL de Facebook")
         
-        scraper = get_scraper_instance(headless=True)
-        result = scraper.scrape_post_by_url(url)
+        result = _run_traced(debug, scrape_service.scrape_post, url, blocking_profile='post-text')
         
         if not result['success']:
             raise HTTPException(status_code=404, detail=result.get('error'))
@@ -111,30 +271,40 @@ def scrape_get(url: str = Query(..., description="URL del post de Facebook")):
         
     except HTTPException:
         raise
+    except (PoolTimeoutError, ThrottleTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/scrape/images-only")
-def scrape_images_only(request: PostURLRequest):
+def scrape_images_only(request: PostURLRequest, debug: bool = Query(False, description="Incluir los tiempos de cada etapa")):
     try:
-        scraper = get_scraper_instance(headless=True)
-        result = scraper.scrape_post_by_url(request.url)
+        result = _run_traced(debug, scrape_service.scrape_post, request.url, blocking_profile='images-only')
         
         if not result['success']:
             raise HTTPException(status_code=404, detail=result.get('error'))
         
         image_urls = [img['url'] for img in result['post']['images']] if result['post'] else []
         
-        return {
+        response = {
             'success': True,
             'url': request.url,
             'total_images': len(image_urls),
             'images': image_urls
         }
+        if 'timings' in result:
+            response['timings'] = result['timings']
+        return response
         
     except HTTPException:
         raise
+    except (PoolTimeoutError, ThrottleTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -143,8 +313,14 @@ def scrape_images_only(request: PostURLRequest):
 def scrape_page(request: PageRequest):
     try:
         logger.info(f"📄 Scrapeando página: {request.page_url}")
-        scraper = get_scraper_instance(headless=True)
-        result = scraper.scrape_page_posts(request.page_url, request.num_posts)
+
+        if request.stream:
+            return StreamingResponse(
+                _ndjson(scrape_service.iter_page_posts(request.page_url, request.num_posts)),
+                media_type="application/x-ndjson"
+            )
+
+        result = scrape_service.scrape_page(request.page_url, request.num_posts)
         
         if not result['success']:
             raise HTTPException(status_code=500, detail=result.get('error'))
@@ -153,20 +329,38 @@ def scrape_page(request: PageRequest):
         
     except HTTPException:
         raise
+    except (PoolTimeoutError, ThrottleTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _ndjson(events):
+    # Los errores a mitad del stream ya no pueden cambiar el status HTTP: van como evento
+    try:
+        for event in events:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    except Exception as e:
+        logger.error(f"❌ Error en stream: {e}")
+        yield json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False) + "\n"
+    finally:
+        # Cliente desconectado: cerrar el generador cancela los posts que todavía no empezaron
+        close = getattr(events, 'close', None)
+        if close:
+            close()
+
+
 @app.get("/scrape/video")
-def scrape_video_get(url: str = Query(..., description="URL del post de Facebook")):
+def scrape_video_get(url: str = Query(..., description="URL del post de Facebook"), debug: bool = Query(False, description="Incluir los tiempos de cada etapa")):
     try:
         logger.info(f"📬 GET /scrape/video - URL: {url}")
 
-        if 'facebook.com' not in url.lower():
+        if not is_supported_url(url):
             raise HTTPException(status_code=400, detail="Debe ser URL de Facebook")
 
-        scraper = get_scraper_instance(headless=True)
-        result = scraper.scrape_video_by_url(url)
+        result = _run_traced(debug, scrape_service.scrape_video, url, blocking_profile='video')
 
         if not result.get('success'):
             raise HTTPException(status_code=404, detail=result.get('error'))
@@ -175,16 +369,19 @@ def scrape_video_get(url: str = Query(..., description="URL del post de Facebook
 
     except HTTPException:
         raise
+    except (PoolTimeoutError, ThrottleTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/scrape/video")
-def scrape_video_post(request: PostURLRequest):
+def scrape_video_post(request: PostURLRequest, debug: bool = Query(False, description="Incluir los tiempos de cada etapa")):
     try:
         logger.info(f"📬 POST /scrape/video - URL: {request.url}")
-        scraper = get_scraper_instance(headless=True)
-        result = scraper.scrape_video_by_url(request.url)
+        result = _run_traced(debug, scrape_service.scrape_video, request.url, blocking_profile='video')
 
         if not result.get('success'):
             raise HTTPException(status_code=404, detail=result.get('error', 'Video no encontrado'))
@@ -193,11 +390,104 @@ def scrape_video_post(request: PostURLRequest):
 
     except HTTPException:
         raise
+    except (PoolTimeoutError, ThrottleTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/download/video")
+def download_video(request: Request, url: str = Query(..., description="URL del post de Facebook")):
+    try:
+        logger.info(f"📥 GET /download/video - URL: {url}")
+
+        if not is_supported_url(url):
+            raise HTTPException(status_code=400, detail="Debe ser URL de Facebook")
+
+        result = scrape_service.scrape_video(url, blocking_profile='video')
+        if not result.get('success'):
+            raise HTTPException(status_code=404, detail=result.get('error', 'Video no encontrado'))
+
+        media_cache = get_media_cache()
+        media_key = None
+        range_header = request.headers.get('range')
+        requested = parse_range_header(range_header)
+        # Rangos múltiples o condicionales (If-Range) van directo al upstream
+        if media_cache and (requested or not range_header) and not request.headers.get('if-range'):
+            media_key = video_proxy.media_key(result, url)
+            hit = media_cache.lookup(media_key, requested)
+            if hit:
+                logger.info(f"💾 Video servido desde disco ({hit['end'] - hit['start'] + 1} bytes)")
+                headers = video_proxy.cached_response_headers(hit, ranged=requested is not None)
+                headers['Content-Disposition'] = f'inline; filename="{video_proxy.download_filename(url)}"'
+                return StreamingResponse(
+                    media_cache.iter_file(hit['file'], hit['start'], hit['end'], video_proxy.CHUNK_SIZE),
+                    status_code=206 if requested is not None else 200,
+                    headers=headers,
+                    media_type=hit['content_type']
+                )
+
+        upstream = video_proxy.open_upstream(result['video_url'], video_proxy.referer_candidates(result), request.headers)
+        if upstream is None and result.get('cached'):
+            # La URL firmada cacheada pudo haber sido revocada: resolver de nuevo una vez
+            scrape_service.invalidate('video', url)
+            result = scrape_service.scrape_video(url, blocking_profile='video')
+            if result.get('success'):
+                upstream = video_proxy.open_upstream(result['video_url'], video_proxy.referer_candidates(result), request.headers)
+                if media_key:
+                    media_key = video_proxy.media_key(result, url)
+        if upstream is None:
+            raise HTTPException(status_code=502, detail="fbcdn rechazó la descarga del video")
+
+        headers = video_proxy.response_headers(upstream)
+        headers['Content-Disposition'] = f'inline; filename="{video_proxy.download_filename(url)}"'
+        body = video_proxy.iter_upstream(upstream)
+        if media_cache and media_key:
+            body = video_proxy.tee_to_cache(media_cache, media_key, upstream, body)
+        return StreamingResponse(
+            body,
+            status_code=upstream.status_code,
+            headers=headers,
+            media_type=headers.get('Content-Type', 'video/mp4')
+        )
+
+    except HTTPException:
+        raise
+    except (PoolTimeoutError, ThrottleTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/jobs", status_code=202)
+def create_job(request: JobRequest):
+    try:
+        job = get_job_manager().submit(request.type, request.urls)
+        return job.to_dict(include_results=False)
+
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job.to_dict()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,394 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from scraper_selenium import FacebookSeleniumScraper
+
+logger = logging.getLogger(__name__)
+
+
+# Cada cuántos bytes escritos se persiste el rango llenado durante una descarga
+PERSIST_EVERY = 4 * 1024 * 1024
+
+# Cada cuántos segundos se vuelve a medir el uso real del directorio (lo llenan todos los workers)
+DISK_SCAN_INTERVAL = 10.0
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def parse_range_header(value: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """'bytes=a-b' → (a, b); 'bytes=a-' → (a, None); 'bytes=-n' → (None, n). None si no aplica."""
+    if not value:
+        return None
+    m = _RANGE_RE.match(value.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    start = int(m.group(1)) if m.group(1) else None
+    end = int(m.group(2)) if m.group(2) else None
+    return start, end
+
+
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, int, Optional[int]]]:
+    if not value:
+        return None
+    m = _CONTENT_RANGE_RE.match(value.strip())
+    if not m:
+        return None
+    total = int(m.group(3)) if m.group(3) != '*' else None
+    return int(m.group(1)), int(m.group(2)), total
+
+
+def resolve_range(requested: Optional[Tuple[Optional[int], Optional[int]]], total: int) -> Optional[Tuple[int, int]]:
+    """Rango pedido → (inicio, fin inclusivo) dentro de [0, total); None si no es satisfacible"""
+    if requested is None:
+        return (0, total - 1) if total > 0 else None
+    start, end = requested
+    if start is None:
+        start, end = max(0, total - end), total - 1
+    elif end is None or end >= total:
+        end = total - 1
+    if start > end or start >= total:
+        return None
+    return start, end
+
+
+def _merge(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Agrega [start, end) a una lista ordenada de rangos semiabiertos, fusionando solapes"""
+    merged = []
+    for s, e in sorted(ranges + [[start, end]]):
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return merged
+
+
+def _covers(ranges: List[List[int]], start: int, end: int) -> bool:
+    """¿[start, end] (inclusivo) está completamente dentro de los rangos llenados?"""
+    return any(s <= start and end + 1 <= e for s, e in ranges)
+
+
+class MediaCache:
+    """Cache en disco de bytes de video, direccionada por contenido.
+
+    Cada entrada es un archivo disperso del tamaño total del video más un
+    JSON con los rangos ya descargados, así que se llena de a partes a medida
+    que llegan requests con Range. El presupuesto de bytes es del directorio
+    entero (compartido por todos los workers): el uso se vuelve a medir en
+    disco cada DISK_SCAN_INTERVAL y se desaloja por LRU según la fecha de
+    último acceso de cada archivo.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._active = set()
+        # key -> [bytes llenados, último acceso]
+        self._index: Dict[str, List[float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scanned_at = 0.0
+        self._scan(remove_tmp=True)
+
+    @staticmethod
+    def make_key(video_url: str, video_id: Optional[str] = None) -> str:
+        """Clave estable: el id del video más la ruta del asset sin host ni firma.
+
+        La URL pasa primero por normalize_video_url (sin bytestart/byteend); el
+        host de fbcdn y los parámetros firmados (oe, oh, _nc_*) cambian entre
+        resoluciones del mismo video, la ruta del archivo no.
+        """
+        normalized = FacebookSeleniumScraper.normalize_video_url(video_url)
+        identity = f"{video_id or ''}|{urlparse(normalized).path}"
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, key[:2], key)
+        return base + '.data', base + '.json'
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _scan(self, remove_tmp: bool = False):
+        """Reconstruye el índice desde disco, con las entradas de todos los workers"""
+        index: Dict[str, List[float]] = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    if remove_tmp:
+                        # Restos de una escritura interrumpida (sólo al arrancar: después pueden ser de otro worker)
+                        try:
+                            os.remove(os.path.join(root, name))
+                        except OSError:
+                            pass
+                    continue
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-5]
+                meta = self._read_meta(key)
+                data_path, _ = self._paths(key)
+                if not meta:
+                    continue
+                try:
+                    accessed = os.path.getmtime(data_path)
+                except OSError:
+                    continue
+                index[key] = [sum(e - s for s, e in meta.get('ranges', [])), accessed]
+        with self._lock:
+            self._index = index
+            self._scanned_at = time.monotonic()
+
+    def _read_meta(self, key: str) -> Optional[Dict]:
+        _, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key: str, meta: Dict):
+        _, meta_path = self._paths(key)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(meta_path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def lookup(self, key: str, requested: Optional[Tuple[Optional[int], Optional[int]]]) -> Optional[Dict]:
+        """Si el rango pedido ya está en disco devuelve {'file', 'start', 'end', 'total', 'content_type'}.
+
+        El archivo se abre acá: si otro hilo lo desaloja después, los datos siguen
+        legibles por ese descriptor; si ya no estaba, cuenta como miss.
+        """
+        meta = self._read_meta(key)
+        data_path, _ = self._paths(key)
+        span = resolve_range(requested, meta['total']) if meta else None
+        if span and _covers(meta['ranges'], span[0], span[1]):
+            try:
+                data_file = open(data_path, 'rb', buffering=0)
+            except FileNotFoundError:
+                data_file = None
+            if data_file is not None:
+                now = time.time()
+                try:
+                    os.utime(data_path, (now, now))
+                except OSError:
+                    pass
+                with self._lock:
+                    self.hits += 1
+                    if key in self._index:
+                        self._index[key][1] = now
+                return {
+                    'file': data_file,
+                    'start': span[0],
+                    'end': span[1],
+                    'total': meta['total'],
+                    'content_type': meta.get('content_type') or 'video/mp4',
+                }
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def iter_file(self, data_file, start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+        """Lee [start, end] del archivo de un hit en bloques de chunk_size con pread y lo cierra al terminar"""
+        try:
+            fd = data_file.fileno()
+            pos = start
+            while pos <= end:
+                chunk = os.pread(fd, min(chunk_size, end + 1 - pos), pos)
+                if not chunk:
+                    break
+                yield chunk
+                pos += len(chunk)
+        finally:
+            data_file.close()
+
+    @contextmanager
+    def _locked(self, key: str):
+        """Exclusión sobre una entrada entre hilos (lock por clave) y entre workers (flock)"""
+        _, meta_path = self._paths(key)
+        lock_file = None
+        with self._key_lock(key):
+            try:
+                if fcntl is not None:
+                    lock_file = open(meta_path + '.lock', 'w')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+
+    def _prepare(self, key: str, total: int, content_type: Optional[str]) -> Tuple[int, int]:
+        """Abre (creándolo si hace falta) el archivo de datos para escribir; devuelve (fd, inode)"""
+        data_path, _ = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        # Bajo el lock: otro llenado no puede reemplazar el archivo entre la verificación y el open
+        with self._locked(key):
+            meta = self._read_meta(key)
+            if not (meta and meta.get('total') == total and os.path.exists(data_path)):
+                # Archivo disperso creado de forma atómica: nunca se ve uno a medio crear
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(data_path), suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.truncate(total)
+                os.replace(tmp_path, data_path)
+                self._write_meta(key, {'total': total, 'ranges': [], 'content_type': content_type})
+            fd = os.open(data_path, os.O_WRONLY)
+        return fd, os.fstat(fd).st_ino
+
+    def _record(self, key: str, start: int, end: int, inode: Optional[int] = None):
+        """Marca [start, end) como llenado; la metadata se reemplaza atómicamente.
+
+        Con `inode`, sólo si el archivo de datos sigue siendo el que se escribió:
+        si otro llenado lo reemplazó (o se desalojó), esos bytes ya no están ahí.
+        """
+        if end <= start:
+            return
+        data_path, _ = self._paths(key)
+        with self._locked(key):
+            if inode is not None:
+                try:
+                    if os.stat(data_path).st_ino != inode:
+                        return
+                except OSError:
+                    return
+            meta = self._read_meta(key)
+            if not meta:
+                return
+            meta['ranges'] = _merge(meta['ranges'], start, end)
+            self._write_meta(key, meta)
+            filled = sum(e - s for s, e in meta['ranges'])
+        with self._lock:
+            self._index[key] = [filled, time.time()]
+        self._enforce_budget()
+
+    def tee(self, key: str, chunks: Iterator[bytes], offset: int, total: Optional[int],
+            content_type: Optional[str] = None) -> Iterator[bytes]:
+        """Reenvía los bytes del upstream y a la vez los escribe en su offset dentro de la entrada"""
+        if not total or total > self.max_bytes:
+            yield from chunks
+            return
+
+        try:
+            fd, inode = self._prepare(key, total, content_type)
+        except OSError as e:
+            logger.warning(f"Cache de media no disponible para {key}: {e}")
+            yield from chunks
+            return
+
+        with self._lock:
+            self._active.add(key)
+        pos = persisted = offset
+        caching = True
+
+        def stop_caching():
+            """Cierra la escritura; lo escrito hasta acá (también si se cortó la descarga) queda aprovechable"""
+            nonlocal caching
+            caching = False
+            os.close(fd)
+            try:
+                self._record(key, persisted, min(pos, total), inode)
+            except OSError as e:
+                logger.warning(f"Cache de media: no se pudo registrar {key[:12]}: {e}")
+            with self._lock:
+                self._active.discard(key)
+
+        try:
+            for chunk in chunks:
+                if caching:
+                    try:
+                        if pos + len(chunk) <= total and os.pwrite(fd, chunk, pos) != len(chunk):
+                            raise OSError('escritura parcial')
+                        if pos + len(chunk) - persisted >= PERSIST_EVERY:
+                            self._record(key, persisted, min(pos + len(chunk), total), inode)
+                            persisted = pos + len(chunk)
+                    except OSError as e:
+                        # Disco lleno, EIO...: la descarga sigue, sólo se deja de cachear
+                        logger.warning(f"Cache de media: error escribiendo {key[:12]}, se sigue sin cachear: {e}")
+                        stop_caching()
+                if caching:
+                    pos += len(chunk)
+                yield chunk
+        finally:
+            if caching:
+                stop_caching()
+
+    def _evict(self, key: str):
+        data_path, meta_path = self._paths(key)
+        for path in (data_path, meta_path, meta_path + '.lock'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _enforce_budget(self):
+        with self._lock:
+            stale = time.monotonic() - self._scanned_at >= DISK_SCAN_INTERVAL
+        if stale:
+            self._scan()
+        with self._lock:
+            used = sum(size for size, _ in self._index.values())
+            if used <= self.max_bytes:
+                return
+            victims = []
+            for key, (size, _) in sorted(self._index.items(), key=lambda kv: kv[1][1]):
+                if used <= self.max_bytes:
+                    break
+                if key in self._active:
+                    continue
+                victims.append(key)
+                used -= size
+                del self._index[key]
+                self._key_locks.pop(key, None)
+            self.evictions += len(victims)
+
+        for key in victims:
+            logger.info(f"🧹 Desalojando video cacheado {key[:12]}")
+            self._evict(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'bytes': int(sum(size for size, _ in self._index.values())),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_media_cache = None
+_media_cache_lock = threading.Lock()
+
+
+def get_media_cache() -> Optional[MediaCache]:
+    """Cache compartida; None si MEDIA_CACHE_MAX_MB=0"""
+    global _media_cache
+    with _media_cache_lock:
+        if _media_cache is None:
+            max_mb = float(os.environ.get('MEDIA_CACHE_MAX_MB', '2048'))
+            if max_mb <= 0:
+                return None
+            directory = os.environ.get('MEDIA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'video-downloader-media'))
+            _media_cache = MediaCache(directory, int(max_mb * 1024 * 1024))
+        return _media_cache
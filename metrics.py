@@ -0,0 +1,134 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Límites (segundos) de los buckets de los histogramas de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Spans del request en curso (sólo si se pidió debug); viaja con el contexto del hilo
+_current_trace: ContextVar[Optional[List[Dict]]] = ContextVar('current_trace', default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus, con una serie por combinación de labels"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [conteos por bucket..., suma, total]
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{_format_labels(labels + (("le", repr(bound)),))} {count}')
+                lines.append(f'{self.name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {series[-1]}')
+                lines.append(f'{self.name}_sum{_format_labels(labels)} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{_format_labels(labels)} {series[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(labels)} {value}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram('scraper_request_seconds', 'Latencia de cada endpoint HTTP')
+REQUESTS_TOTAL = Counter('scraper_requests_total', 'Requests atendidos por endpoint y status')
+STAGE_LATENCY = Histogram('scraper_stage_seconds', 'Latencia de cada etapa del scrape')
+EXTRACTION_STRATEGY = Counter('scraper_extraction_strategy_total', 'Estrategia que produjo la URL del video')
+HEDGES_TOTAL = Counter('scraper_hedges_total', 'Hedges por método y resultado (won, lost, skipped_*)')
+THROTTLE_SIGNALS = Counter('scraper_throttle_signals_total', 'Señales de bloqueo de Facebook por tipo')
+
+
+@contextmanager
+def span(stage: str):
+    """Mide una etapa: siempre alimenta el histograma y, si hay un trace activo, lo agrega ahí"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append({'stage': stage, 'ms': round(1000 * elapsed, 2)})
+
+
+@contextmanager
+def trace():
+    """Activa la recolección de spans para el request actual; entrega la lista que se va llenando"""
+    spans: List[Dict] = []
+    token = _current_trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+
+def record_strategy(kind: str, strategy: Optional[str]):
+    EXTRACTION_STRATEGY.inc(kind=kind, strategy=strategy or 'unknown')
+
+
+def gauge_lines(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f'{name}{_format_labels(tuple(sorted(labels.items())))} {float(value)}')
+    return lines
+
+
+def render(extra_lines: Iterable[str] = ()) -> str:
+    """Exposición en formato de texto de Prometheus (versión 0.0.4)"""
+    lines: List[str] = []
+    for metric in (REQUEST_LATENCY, REQUESTS_TOTAL, STAGE_LATENCY, EXTRACTION_STRATEGY, HEDGES_TOTAL,
+                   THROTTLE_SIGNALS):
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
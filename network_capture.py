@@ -0,0 +1,114 @@
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+MEDIA_MARKERS = ('.mp4', '.m3u8', 'video.fsci')
+
+POLL_INTERVAL = 0.1
+
+_EVENTS = ('Network.requestWillBeSent', 'Network.responseReceived')
+
+
+class ScrapeCancelled(Exception):
+    """El scrape se canceló desde otro hilo (p. ej. perdió un hedge)"""
+
+
+def is_media_url(url: Optional[str]) -> bool:
+    if not url or url.startswith('blob:'):
+        return False
+    low = url.lower()
+    return any(marker in low for marker in MEDIA_MARKERS)
+
+
+class NetworkCapture:
+    """Escucha incremental de eventos de red de Chrome DevTools.
+
+    Consume el log 'performance' de chromedriver (eventos CDP Network.*) a
+    medida que llegan, filtra las URLs de media y permite terminar en cuanto
+    aparece una respuesta utilizable (.mp4/.m3u8/video.fsci con 200/206).
+    Si se activa `cancel`, la espera en curso lanza ScrapeCancelled.
+    """
+
+    def __init__(self, driver, normalize=None, cancel: Optional[threading.Event] = None):
+        self.driver = driver
+        self.normalize = normalize
+        self.cancel = cancel
+        self.available = True
+        self.candidates: List[str] = []
+        self.headers: Dict[str, Dict[str, str]] = {}
+        self.usable: List[str] = []
+        self._seen = set()
+
+    def start(self):
+        """Activa Network y descarta el log acumulado de navegaciones anteriores"""
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+        except Exception:
+            pass
+        try:
+            self.driver.get_log('performance')
+        except Exception as e:
+            logger.debug(f"Log de performance no disponible: {e}")
+            self.available = False
+
+    def _add_candidate(self, url: str):
+        for candidate in (url, self.normalize(url) if self.normalize else url):
+            if candidate not in self._seen:
+                self._seen.add(candidate)
+                self.candidates.append(candidate)
+
+    def poll(self) -> int:
+        """Procesa las entradas nuevas del log; devuelve cuántas respuestas utilizables hay"""
+        if not self.available:
+            return 0
+        try:
+            logs = self.driver.get_log('performance')
+        except Exception as e:
+            logger.debug(f"No se pudo leer performance logs: {e}")
+            self.available = False
+            return len(self.usable)
+
+        for entry in logs:
+            raw = entry.get('message', '')
+            # Filtro barato antes de parsear: la mayoría de eventos no son de red
+            if not any(event in raw for event in _EVENTS):
+                continue
+            try:
+                msg = json.loads(raw)['message']
+            except Exception:
+                continue
+            method = msg.get('method', '')
+            params = msg.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                req = params.get('request', {})
+                url_seen = req.get('url')
+                if is_media_url(url_seen):
+                    self._add_candidate(url_seen)
+                    hdrs = req.get('headers', {}) or {}
+                    if isinstance(hdrs, dict):
+                        self.headers[url_seen] = {k: str(v) for k, v in hdrs.items()}
+            elif method == 'Network.responseReceived':
+                response = params.get('response', {})
+                url_seen = response.get('url')
+                if is_media_url(url_seen):
+                    self._add_candidate(url_seen)
+                    if response.get('status') in (200, 206) and url_seen not in self.usable:
+                        self.usable.append(url_seen)
+        return len(self.usable)
+
+    def wait_for_media(self, timeout: float) -> bool:
+        """Consume eventos hasta ver una respuesta de media utilizable o vencer el timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.cancel is not None and self.cancel.is_set():
+                raise ScrapeCancelled('Scrape cancelado durante la espera de media')
+            if self.poll():
+                return True
+            if not self.available or time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
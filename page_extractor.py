@@ -0,0 +1,292 @@
+import html
+import json
+import logging
+import re
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+    SOUP_PARSER = 'lxml'
+except Exception:
+    SOUP_PARSER = 'html.parser'
+
+logger = logging.getLogger(__name__)
+
+
+# Claves JSON de video en el orden de preferencia histórico de extract_video_url
+JSON_VIDEO_KEYS = [
+    'playable_url',
+    'playable_url_quality_hd',
+    'playable_url_quality_sd',
+    'hd_src',
+    'sd_src',
+    'sd_src_no_ratelimit',
+    'hd_src_no_ratelimit',
+    'fallback_playable_url',
+]
+
+# Prioridad de cada estrategia de extracción (menor = preferida)
+SOURCE_PRIORITY = {
+    'og:video': 0,
+    'video_tag': 1,
+    'source_tag': 2,
+    **{f'json:{key}': 3 + i for i, key in enumerate(JSON_VIDEO_KEYS)},
+    'json:escaped_src': 3 + len(JSON_VIDEO_KEYS),
+    'anchor': 4 + len(JSON_VIDEO_KEYS),
+    'fbcdn': 5 + len(JSON_VIDEO_KEYS),
+}
+
+IMAGE_EXCLUDE = ('emoji', 'static', 'safe_image', 'rsrc.php')
+
+# URLs de video en el JSON embebido: sólo https, salvo http en loopback para el servidor local de bench/
+# (también con las barras escapadas del JSON). Es sintaxis válida en Python y en JavaScript.
+JSON_URL_PATTERN = r'https:[^"]+|http:(?:\\?/){2}(?:localhost|127\.0\.0\.1)[:/\\][^"]+'
+
+# Una sola alternancia: cada posición del documento se examina una vez
+_COMBINED_RE = re.compile(
+    r'"(?P<jkey>' + '|'.join(sorted(JSON_VIDEO_KEYS, key=len, reverse=True)) + r')":"(?P<jurl>' + JSON_URL_PATTERN + r')"'
+    r'|src\\":"(?P<esrc>https://video[^"]+)'
+    r'|<(?P<tag>meta|img|video|source|a)\b(?P<attrs>[^>]*)>'
+    r'|</(?P<endtag>video)\s*>'
+    r'|(?P<fbcdn>https://[a-z0-9.\-]*fbcdn\.net[^"\'>\s]+)',
+    re.IGNORECASE,
+)
+
+_ATTR_RE = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))')
+
+
+def make_soup(page_source: str) -> BeautifulSoup:
+    """BeautifulSoup con lxml si está instalado (bastante más rápido que html.parser)"""
+    return BeautifulSoup(page_source, SOUP_PARSER)
+
+
+def _attrs(raw: str) -> Dict[str, str]:
+    result = {}
+    for m in _ATTR_RE.finditer(raw):
+        value = m.group(2) if m.group(2) is not None else m.group(3) if m.group(3) is not None else m.group(4)
+        result.setdefault(m.group(1).lower(), html.unescape(value))
+    return result
+
+
+def _unescape_json_url(value: str) -> str:
+    try:
+        return json.loads(f'"{value}"')
+    except ValueError:
+        return value.replace('\\u0025', '%').replace('\\/', '/').replace('\\u0026', '&')
+
+
+def _quality(source: str) -> str:
+    if source.endswith('_hd') or source.startswith('json:hd_src'):
+        return 'hd'
+    if source.endswith('_sd') or source.startswith('json:sd_src') or source == 'json:playable_url':
+        return 'sd'
+    return 'unknown'
+
+
+def extract_media(page_source: str) -> Dict:
+    """Extrae en una sola pasada todas las variantes de video, imágenes y og:image.
+
+    Devuelve {'videos': [{'url', 'quality', 'source'}], 'images': [...],
+    'og_image': str|None}. Los videos vienen ordenados por preferencia
+    (SOURCE_PRIORITY) y, dentro de cada estrategia, por aparición.
+    """
+    videos: List[Dict] = []
+    seen_videos = set()
+    # dict como conjunto ordenado: deduplica en O(1) manteniendo el orden de aparición
+    src_images: Dict[str, None] = {}
+    data_src_images: Dict[str, None] = {}
+    og_image = None
+    in_video = False
+
+    def add_video(url: Optional[str], source: str):
+        if not url or url in seen_videos:
+            return
+        seen_videos.add(url)
+        videos.append({'url': url, 'quality': _quality(source), 'source': source})
+
+    for m in _COMBINED_RE.finditer(page_source or ''):
+        if m.group('jkey'):
+            add_video(_unescape_json_url(m.group('jurl')), f"json:{m.group('jkey')}")
+        elif m.group('esrc'):
+            add_video(_unescape_json_url(m.group('esrc')), 'json:escaped_src')
+        elif m.group('fbcdn'):
+            add_video(m.group('fbcdn'), 'fbcdn')
+        elif m.group('endtag'):
+            # Un <source> fuera del <video> (p. ej. en <picture>) no es una variante de video
+            in_video = False
+        else:
+            tag = m.group('tag').lower()
+            attrs = _attrs(m.group('attrs'))
+            if tag == 'meta':
+                prop = attrs.get('property', '')
+                if prop in ('og:video', 'og:video:url'):
+                    add_video(attrs.get('content'), 'og:video')
+                elif prop == 'og:image' and not og_image:
+                    og_image = attrs.get('content')
+            elif tag == 'img':
+                src = attrs.get('src')
+                if src and 'scontent' in src and not any(x in src for x in IMAGE_EXCLUDE):
+                    src_images.setdefault(src)
+                data_src = attrs.get('data-src')
+                if data_src and 'scontent' in data_src:
+                    data_src_images.setdefault(data_src)
+            elif tag == 'video':
+                in_video = True
+                add_video(attrs.get('src') or attrs.get('data-src'), 'video_tag')
+            elif tag == 'source' and in_video:
+                add_video(attrs.get('src'), 'source_tag')
+            elif tag == 'a':
+                href = attrs.get('href', '')
+                if 'video.php' in href or ('play' in href and 'fbcdn' in href):
+                    add_video('https://m.facebook.com' + href if href.startswith('/') else href, 'anchor')
+
+            # Las URLs fbcdn dentro de atributos también cuentan como último recurso
+            for value in attrs.values():
+                if 'fbcdn.net' in value and value.startswith('https://'):
+                    add_video(value, 'fbcdn')
+
+    videos.sort(key=lambda v: SOURCE_PRIORITY[v['source']])
+    images = list(src_images) + [img for img in data_src_images if img not in src_images]
+    return {'videos': videos, 'images': images, 'og_image': og_image}
+
+
+# Extracción dentro de la página: devuelve sólo lo que el scraper necesita en
+# vez de serializar todo el DOM por el puente de WebDriver. Las búsquedas por
+# regex corren sobre el mismo HTML que devolvería page_source, así que
+# encuentran lo mismo que _COMBINED_RE; el orden y la deduplicación se
+# resuelven en Python con las mismas reglas que extract_media.
+JS_EXTRACT_MEDIA = r"""
+    var keys = arguments[0], exclude = arguments[1], urlPattern = arguments[2];
+    var root = document.documentElement;
+    var html = root ? root.outerHTML : '';
+    var out = {og_video: [], video_tag: [], source_tag: [], json: [], escaped_src: [], anchor: [],
+               fbcdn: [], images_src: [], images_data_src: [], og_image: null, text: ''};
+    var m, re;
+
+    re = new RegExp('"(' + keys.join('|') + ')":"(' + urlPattern + ')"', 'gi');
+    while ((m = re.exec(html)) !== null) out.json.push([m[1], m[2]]);
+    re = /src\\":"(https:\/\/video[^"]+)/gi;
+    while ((m = re.exec(html)) !== null) out.escaped_src.push(m[1]);
+    re = /https:\/\/[a-z0-9.\-]*fbcdn\.net[^"'>\s]+/gi;
+    while ((m = re.exec(html)) !== null) out.fbcdn.push(m[0]);
+
+    document.querySelectorAll('meta[property]').forEach(function(el) {
+        var prop = el.getAttribute('property'), content = el.getAttribute('content');
+        if (!content) return;
+        if (prop === 'og:video' || prop === 'og:video:url') out.og_video.push(content);
+        else if (prop === 'og:image' && out.og_image === null) out.og_image = content;
+    });
+    document.querySelectorAll('video').forEach(function(el) {
+        var src = el.getAttribute('src') || el.getAttribute('data-src');
+        if (src) out.video_tag.push(src);
+        el.querySelectorAll('source[src]').forEach(function(s) { out.source_tag.push(s.getAttribute('src')); });
+    });
+    document.querySelectorAll('a[href]').forEach(function(el) {
+        var href = el.getAttribute('href');
+        if (href.indexOf('video.php') !== -1 || (href.indexOf('play') !== -1 && href.indexOf('fbcdn') !== -1)) {
+            out.anchor.push(href);
+        }
+    });
+    document.querySelectorAll('img').forEach(function(el) {
+        var src = el.getAttribute('src'), dataSrc = el.getAttribute('data-src');
+        if (src && src.indexOf('scontent') !== -1 && !exclude.some(function(x) { return src.indexOf(x) !== -1; })) {
+            out.images_src.push(src);
+        }
+        if (dataSrc && dataSrc.indexOf('scontent') !== -1) out.images_data_src.push(dataSrc);
+    });
+
+    // Igual que get_text(strip=True) de BeautifulSoup: cada nodo de texto recortado, sin separador
+    var textOf = function(el) {
+        var walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT), parts = [], node;
+        while ((node = walker.nextNode())) {
+            var t = node.nodeValue.trim();
+            if (t) parts.push(t);
+        }
+        return parts.join('');
+    };
+    document.querySelectorAll('div[data-ft]').forEach(function(el) {
+        var t = textOf(el);
+        if (t.length > 20 && t.length > out.text.length) out.text = t;
+    });
+    if (!out.text && document.body) {
+        var lines = (document.body.textContent || '').split('\n');
+        for (var i = 0; i < lines.length; i++) {
+            if (lines[i].trim().length > 30) { out.text = lines[i].trim(); break; }
+        }
+    }
+    return out;
+"""
+
+
+def media_from_browser(raw: Dict) -> Dict:
+    """Convierte la salida de JS_EXTRACT_MEDIA al formato de extract_media (más 'text')"""
+    videos: List[Dict] = []
+    seen_videos = set()
+
+    def add_video(url: Optional[str], source: str):
+        if not url or url in seen_videos:
+            return
+        seen_videos.add(url)
+        videos.append({'url': url, 'quality': _quality(source), 'source': source})
+
+    for url in raw.get('og_video') or []:
+        add_video(url, 'og:video')
+    for url in raw.get('video_tag') or []:
+        add_video(url, 'video_tag')
+    for url in raw.get('source_tag') or []:
+        add_video(url, 'source_tag')
+    # Como en _COMBINED_RE, la clave JSON se normaliza a su forma canónica
+    canonical = {key.lower(): key for key in JSON_VIDEO_KEYS}
+    for key, url in raw.get('json') or []:
+        add_video(_unescape_json_url(url), f"json:{canonical.get(key.lower(), key)}")
+    for url in raw.get('escaped_src') or []:
+        add_video(_unescape_json_url(url), 'json:escaped_src')
+    for href in raw.get('anchor') or []:
+        add_video('https://m.facebook.com' + href if href.startswith('/') else href, 'anchor')
+    for url in raw.get('fbcdn') or []:
+        add_video(url, 'fbcdn')
+
+    videos.sort(key=lambda v: SOURCE_PRIORITY[v['source']])
+    src_images = dict.fromkeys(raw.get('images_src') or [])
+    images = list(src_images) + [img for img in dict.fromkeys(raw.get('images_data_src') or []) if img not in src_images]
+    return {'videos': videos, 'images': images, 'og_image': raw.get('og_image'), 'text': raw.get('text') or ''}
+
+
+def extract_in_browser(driver) -> Optional[Dict]:
+    """Extracción con un único script en la página; None si no se pudo ejecutar"""
+    try:
+        raw = driver.execute_script(
+            JS_EXTRACT_MEDIA, sorted(JSON_VIDEO_KEYS, key=len, reverse=True), list(IMAGE_EXCLUDE), JSON_URL_PATTERN
+        )
+    except Exception as e:
+        logger.debug(f"Extracción en el navegador no disponible: {e}")
+        return None
+    if not isinstance(raw, dict):
+        return None
+    return media_from_browser(raw)
+
+
+def best_video(extraction: Dict) -> Optional[Dict]:
+    videos = extraction.get('videos') or []
+    return videos[0] if videos else None
+
+
+def extract_text(soup: BeautifulSoup) -> str:
+    """Texto del post: el div[data-ft] más largo o, si no hay, la primera línea larga"""
+    post_text = ""
+    try:
+        for div in soup.find_all('div', {'data-ft': True}):
+            text = div.get_text(strip=True)
+            if len(text) > 20 and len(text) > len(post_text):
+                post_text = text
+
+        if not post_text:
+            all_text = soup.get_text()
+            lines = [line.strip() for line in all_text.split('\n') if len(line.strip()) > 30]
+            if lines:
+                post_text = lines[0]
+    except Exception as e:
+        logger.warning(f"No se pudo extraer texto: {e}")
+    return post_text
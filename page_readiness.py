@@ -0,0 +1,154 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from network_capture import MEDIA_MARKERS, ScrapeCancelled
+
+logger = logging.getLogger(__name__)
+
+
+# Deadline (segundos) por etapa; se pueden sobreescribir con SCRAPER_DEADLINE_<ETAPA>
+DEFAULT_DEADLINES = {
+    'dom_ready': 10.0,
+    'content': 3.0,
+    'video': 4.0,
+    'media_request': 3.0,
+    'media_request_fallback': 4.0,
+    'scroll_stable': 3.0,
+}
+
+POLL_INTERVAL = 0.1
+
+# Ventana sin cambios para considerar el scroll "en reposo"
+QUIET_WINDOW = 0.5
+
+_JS_SCROLL_HEIGHT = "return document.body ? document.body.scrollHeight : 0;"
+_JS_HAS_VIDEO = """
+    return !!document.querySelector(
+        'video[src], video source[src], video[data-src], meta[property="og:video"], meta[property="og:video:url"]'
+    );
+"""
+_JS_HAS_CONTENT = """
+    return !!document.querySelector('img[src*="scontent"], img[data-src*="scontent"], div[data-ft]');
+"""
+_JS_MEDIA_REQUEST = """
+    var marks = arguments[0];
+    return performance.getEntriesByType('resource').some(function(e) {
+        var n = (e.name || '').toLowerCase();
+        return n.indexOf('blob:') !== 0 && marks.some(function(m) { return n.indexOf(m) !== -1; });
+    });
+"""
+
+
+def load_deadlines() -> Dict[str, float]:
+    deadlines = dict(DEFAULT_DEADLINES)
+    for stage in deadlines:
+        value = os.environ.get(f'SCRAPER_DEADLINE_{stage.upper()}')
+        if value:
+            try:
+                deadlines[stage] = float(value)
+            except ValueError:
+                logger.warning(f"Deadline inválido para {stage}: {value}")
+    return deadlines
+
+
+class PageReadiness:
+    """Esperas basadas en eventos de la página en lugar de time.sleep fijos.
+
+    Cada método espera hasta que la condición se cumple o vence el deadline de
+    su etapa, y devuelve True/False sin lanzar excepción por timeout. Si se
+    activa `cancel`, la espera en curso lanza ScrapeCancelled.
+    """
+
+    def __init__(self, driver, deadlines: Optional[Dict[str, float]] = None, cancel: Optional[threading.Event] = None):
+        self.driver = driver
+        self.deadlines = deadlines or load_deadlines()
+        self.cancel = cancel
+
+    def _until(self, stage: str, condition: Callable, timeout: Optional[float] = None) -> bool:
+        if timeout is None:
+            timeout = self.deadlines.get(stage, 3.0)
+        start = time.monotonic()
+        cancel = self.cancel
+
+        def checked(driver):
+            if cancel is not None and cancel.is_set():
+                raise ScrapeCancelled(f'Scrape cancelado durante {stage}')
+            return condition(driver)
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=POLL_INTERVAL).until(checked)
+            logger.debug(f"⏱️ {stage} listo en {time.monotonic() - start:.2f}s")
+            return True
+        except TimeoutException:
+            logger.debug(f"⏱️ {stage} no listo tras {timeout:.1f}s")
+            return False
+
+    def _script_true(self, script: str, *args) -> Callable:
+        def condition(driver):
+            try:
+                return bool(driver.execute_script(script, *args))
+            except Exception:
+                return False
+        return condition
+
+    def _stable(self, script: str) -> Callable:
+        """Condición que se cumple cuando el valor del script no cambia durante QUIET_WINDOW"""
+        state = {'value': None, 'since': time.monotonic()}
+
+        def condition(driver):
+            try:
+                value = driver.execute_script(script)
+            except Exception:
+                return False
+            now = time.monotonic()
+            if value != state['value']:
+                state['value'] = value
+                state['since'] = now
+                return False
+            return now - state['since'] >= QUIET_WINDOW
+        return condition
+
+    def wait_for_dom_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._until(
+            'dom_ready',
+            self._script_true("return document.readyState === 'interactive' || document.readyState === 'complete';"),
+            timeout,
+        )
+
+    def wait_for_content(self, timeout: Optional[float] = None) -> bool:
+        return self._until('content', self._script_true(_JS_HAS_CONTENT), timeout)
+
+    def wait_for_video(self, timeout: Optional[float] = None, stop_when: Optional[Callable[[], object]] = None) -> bool:
+        """Espera un <video>/og:video en el DOM; stop_when permite cortar antes por otra señal"""
+        has_video = self._script_true(_JS_HAS_VIDEO)
+
+        def condition(driver):
+            if stop_when is not None and stop_when():
+                return True
+            return has_video(driver)
+        return self._until('video', condition, timeout)
+
+    def wait_for_media_request(self, timeout: Optional[float] = None, stage: str = 'media_request') -> bool:
+        return self._until(stage, self._script_true(_JS_MEDIA_REQUEST, list(MEDIA_MARKERS)), timeout)
+
+    def wait_for_scroll_stable(self, timeout: Optional[float] = None) -> bool:
+        return self._until('scroll_stable', self._stable(_JS_SCROLL_HEIGHT), timeout)
+
+    def wait_for_height_change(self, previous_height: int, timeout: Optional[float] = None) -> bool:
+        def condition(driver):
+            try:
+                return driver.execute_script(_JS_SCROLL_HEIGHT) != previous_height
+            except Exception:
+                return False
+        return self._until('scroll_stable', condition, timeout)
+
+    def scroll_height(self) -> int:
+        try:
+            return int(self.driver.execute_script(_JS_SCROLL_HEIGHT) or 0)
+        except Exception:
+            return 0
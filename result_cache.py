@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+# Margen para no servir una URL firmada que expira mientras el cliente la usa
+EXPIRY_SAFETY_MARGIN = 60.0
+
+
+def signed_url_expiry(url: str) -> Optional[float]:
+    """Timestamp (epoch) de expiración de una URL firmada de fbcdn (parámetro oe=, en hex)"""
+    try:
+        values = parse_qs(urlparse(url).query).get('oe')
+        if not values:
+            return None
+        return float(int(values[0], 16))
+    except (ValueError, TypeError):
+        return None
+
+
+def _result_urls(result: Dict) -> Iterable[str]:
+    if result.get('video_url'):
+        yield result['video_url']
+    post = result.get('post') or {}
+    for img in post.get('images') or []:
+        if img.get('url'):
+            yield img['url']
+
+
+def result_ttl(result: Dict, default_ttl: float, now: Optional[float] = None) -> float:
+    """TTL de un resultado: el default, acotado por la expiración más cercana de sus URLs firmadas"""
+    now = time.time() if now is None else now
+    ttl = default_ttl
+    for url in _result_urls(result):
+        expiry = signed_url_expiry(url)
+        if expiry is not None:
+            ttl = min(ttl, expiry - now - EXPIRY_SAFETY_MARGIN)
+    return max(0.0, ttl)
+
+
+class TTLLRUCache:
+    """Cache en memoria con expiración por entrada y desalojo LRU"""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 600.0):
+        self.max_entries = max(1, max_entries)
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, record: bool = True) -> Optional[Any]:
+        """Devuelve el valor vigente o None; record=False no cuenta en las métricas de hit/miss"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                if record:
+                    self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if record:
+                self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
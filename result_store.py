@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Cada cuántas escrituras se borran las filas vencidas
+PURGE_EVERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class ResultStore:
+    """Resultados resueltos persistidos en SQLite (modo WAL), compartidos entre workers.
+
+    Cada hilo abre su propia conexión: en WAL los lectores no bloquean al
+    escritor ni entre sí, y SQLite serializa las escrituras entre procesos.
+    La expiración es absoluta (epoch) porque la comparten varios procesos.
+    Cualquier error de SQLite se registra y se trata como un miss.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, attr: str):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(valor, expiración epoch) si hay una entrada vigente; None si no"""
+        try:
+            row = self._connection().execute(
+                'SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?',
+                (key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Store de resultados no disponible: {e}")
+            self._count('errors')
+            return None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO results (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now + ttl, now),
+            )
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % PURGE_EVERY == 0
+            if purge:
+                conn.execute('DELETE FROM results WHERE expires_at <= ?', (now,))
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo persistir {key}: {e}")
+            self._count('errors')
+
+    def delete(self, key: str):
+        try:
+            self._connection().execute('DELETE FROM results WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo borrar {key} del store: {e}")
+            self._count('errors')
+
+    def stats(self) -> Dict:
+        try:
+            entries = self._connection().execute(
+                'SELECT COUNT(*) FROM results WHERE expires_at > ?', (time.time(),)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self._writes,
+                'errors': self.errors,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_result_store = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """Store compartido; None si SCRAPER_RESULT_STORE está vacío o en 0"""
+    global _result_store
+    with _result_store_lock:
+        if _result_store is None:
+            path = os.environ.get(
+                'SCRAPER_RESULT_STORE',
+                os.path.join(tempfile.gettempdir(), 'video-downloader-results.sqlite3'),
+            )
+            if path in ('', '0', 'false', 'no'):
+                return None
+            try:
+                _result_store = ResultStore(path)
+            except sqlite3.Error as e:
+                logger.error(f"❌ No se pudo abrir el store de resultados en {path}: {e}")
+                return None
+            logger.info(f"🗄️ Store de resultados en {path}")
+        return _result_store
@@ -0,0 +1,149 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from driver_pool import PoolTimeoutError, get_driver_pool
+
+logger = logging.getLogger(__name__)
+
+
+HIGH = 'high'
+LOW = 'low'
+PRIORITIES = (HIGH, LOW)
+
+
+class _ClassState:
+    def __init__(self, limit: int, timeout: float):
+        self.limit = max(1, limit)
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.granted = 0
+        self.timeouts = 0
+        self.max_waiting = 0
+        self.wait_total = 0.0
+
+    def stats(self) -> Dict:
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'granted': self.granted,
+            'timeouts': self.timeouts,
+            'avg_wait_ms': round(1000 * self.wait_total / self.granted, 2) if self.granted else 0.0,
+        }
+
+
+class PriorityScheduler:
+    """Turnos para usar un navegador, con dos clases de prioridad.
+
+    - HIGH (un post / un video pedido por un cliente) entra apenas haya cupo
+      en su clase.
+    - LOW (recorrido de páginas, jobs en lote) además espera a que no haya
+      ningún HIGH en cola. Como cada post de un recorrido pide su propio
+      turno, el trabajo LOW cede entre post y post.
+    - Entre las dos clases nunca hay más de `total_limit` turnos (el tamaño
+      del pool): quien pasa el scheduler encuentra un navegador libre, así
+      que los leases del pool se reparten en el orden de prioridad de acá y
+      un LOW no puede ganarle a un HIGH un navegador recién liberado.
+    """
+
+    def __init__(self, high_limit: int, low_limit: int, high_timeout: float = 30.0, low_timeout: float = 300.0,
+                 total_limit: Optional[int] = None):
+        self.total_limit = max(1, total_limit or max(high_limit, low_limit))
+        self._cond = threading.Condition()
+        self._classes = {
+            HIGH: _ClassState(high_limit, high_timeout),
+            LOW: _ClassState(low_limit, low_timeout),
+        }
+
+    def _can_run(self, priority: str) -> bool:
+        state = self._classes[priority]
+        if state.active >= state.limit:
+            return False
+        if sum(s.active for s in self._classes.values()) >= self.total_limit:
+            return False
+        if priority == LOW and self._classes[HIGH].waiting:
+            return False
+        return True
+
+    def acquire(self, priority: str, timeout: Optional[float] = None):
+        state = self._classes[priority]
+        timeout = state.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            state.waiting += 1
+            state.max_waiting = max(state.max_waiting, state.waiting)
+            try:
+                while not self._can_run(priority):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        state.timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Sin turno de prioridad {priority} tras {timeout:.1f}s ({state.active} en curso)"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                state.waiting -= 1
+                # Si se fue un HIGH de la cola, algún LOW puede pasar
+                self._cond.notify_all()
+
+            state.active += 1
+            state.granted += 1
+            state.wait_total += time.monotonic() - start
+
+    def try_acquire(self, priority: str) -> bool:
+        """Turno sin espera (p. ej. para un hedge): True si había cupo"""
+        with self._cond:
+            if not self._can_run(priority):
+                return False
+            state = self._classes[priority]
+            state.active += 1
+            state.granted += 1
+            return True
+
+    def release(self, priority: str):
+        with self._cond:
+            self._classes[priority].active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: str = HIGH, timeout: Optional[float] = None):
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {priority: state.stats() for priority, state in self._classes.items()}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> PriorityScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            pool = get_driver_pool(headless=True)
+            # Por defecto LOW deja siempre un navegador libre para pedidos interactivos
+            high_limit = int(os.environ.get('SCHEDULER_HIGH_LIMIT', '0')) or pool.size
+            low_limit = int(os.environ.get('SCHEDULER_LOW_LIMIT', '0')) or max(1, pool.size - 1)
+            _scheduler = PriorityScheduler(
+                high_limit=high_limit,
+                low_limit=low_limit,
+                high_timeout=float(os.environ.get('SCHEDULER_HIGH_TIMEOUT', str(pool.lease_timeout))),
+                low_timeout=float(os.environ.get('SCHEDULER_LOW_TIMEOUT', '300')),
+                total_limit=pool.size,
+            )
+            logger.info(f"🚦 Scheduler creado (high={high_limit}, low={low_limit}, total={pool.size})")
+        return _scheduler
@@ -0,0 +1,245 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, Optional
+
+from driver_pool import get_driver_pool
+from hedging import HEDGING_ENABLED, get_hedger
+from metrics import span
+from result_cache import TTLLRUCache, result_ttl
+from result_store import get_result_store
+from scheduler import HIGH, LOW, get_scheduler
+from scraper_selenium import FacebookSeleniumScraper
+from singleflight import SingleFlight
+from throttle import ThrottleTimeout, facebook_slot
+from url_canon import resolve
+
+logger = logging.getLogger(__name__)
+
+
+_result_cache = TTLLRUCache(
+    max_entries=int(os.environ.get('SCRAPER_CACHE_SIZE', '1024')),
+    default_ttl=float(os.environ.get('SCRAPER_CACHE_TTL', '600')),
+)
+
+_inflight = SingleFlight()
+
+# Scrapes de posts en paralelo al recorrer una página (0 = tamaño del pool)
+PAGE_CONCURRENCY = int(os.environ.get('SCRAPER_PAGE_CONCURRENCY', '0'))
+
+# Perfil de bloqueo por defecto de cada tipo de resultado cacheado
+DEFAULT_PROFILES = {
+    'post': 'post-text',
+    'video': 'video',
+}
+
+# Método del tier HTTP equivalente a cada método de Selenium
+HTTP_METHODS = {
+    'scrape_post_by_url': 'scrape_post_via_http',
+    'scrape_video_by_url': 'scrape_video_via_http',
+}
+
+# Tiempo máximo que un llamador espera un scrape idéntico ya en curso
+SINGLEFLIGHT_TIMEOUT = float(os.environ.get('SCRAPER_SINGLEFLIGHT_TIMEOUT', '90'))
+
+# Probar primero sólo HTTP (sin navegador) y escalar a Selenium si no alcanza
+HTTP_TIER_ENABLED = os.environ.get('SCRAPER_HTTP_TIER', '1') not in ('0', 'false', 'no')
+
+
+def get_result_cache() -> TTLLRUCache:
+    return _result_cache
+
+
+def get_inflight() -> SingleFlight:
+    return _inflight
+
+
+def cache_key(kind: str, url: str, canon: Optional[Dict] = None) -> str:
+    """Clave canónica: la misma para todas las formas de un contenido (ver url_canon.canonicalize).
+
+    `canon` es el resultado de url_canon.resolve si el pedido ya lo calculó.
+    """
+    return f"{kind}:{(canon or resolve(url))['key']}"
+
+
+def _scrape_via_http(method: str, url: str, mobile_url: str) -> Optional[Dict]:
+    if not HTTP_TIER_ENABLED:
+        return None
+    try:
+        # Instancia sin driver: sólo usa la sesión HTTP compartida
+        with facebook_slot() as throttle, span('http_tier'):
+            result = getattr(FacebookSeleniumScraper(headless=True), method)(url, mobile_url=mobile_url)
+            # None = no alcanzó (las señales de bloqueo ya las reportó fetch_html)
+            if throttle and result is not None:
+                throttle.observe(result)
+            return result
+    except ThrottleTimeout:
+        raise
+    except Exception as e:
+        logger.warning(f"Tier HTTP falló para {url}: {e}")
+        return None
+
+
+def _lookup(key: str, record: bool = True) -> Optional[Dict]:
+    """Cache en memoria y, detrás, el store persistente compartido con otros workers"""
+    cached = _result_cache.get(key, record=record)
+    if cached is not None:
+        return cached
+
+    store = get_result_store()
+    stored = store.get(key) if store else None
+    if stored is None:
+        return None
+    value, expires_at = stored
+    _result_cache.set(key, value, min(_result_cache.default_ttl, expires_at - time.time()))
+    return value
+
+
+def _store(key: str, result: Dict):
+    ttl = result_ttl(result, _result_cache.default_ttl)
+    _result_cache.set(key, result, ttl)
+    store = get_result_store()
+    if store:
+        store.set(key, result, ttl)
+
+
+def _cached_call(kind: str, url: str, method: str, headless: bool, blocking_profile: str, priority: str) -> Dict:
+    if blocking_profile != DEFAULT_PROFILES[kind]:
+        # Un perfil más agresivo puede devolver menos datos: no comparte entrada con el default
+        kind = f"{kind}@{blocking_profile}"
+    # Un enlace corto se resuelve una sola vez por pedido y su destino viaja hasta el scraper
+    canon = resolve(url)
+    key = cache_key(kind, url, canon)
+    cached = _lookup(key)
+    if cached is not None:
+        logger.info(f"⚡ Cache hit: {key}")
+        return dict(cached, cached=True)
+
+    def run() -> Dict:
+        # Otro vuelo (u otro worker) pudo haber llenado la cache justo antes de entrar
+        cached = _lookup(key, record=False)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        result = _scrape_via_http(HTTP_METHODS[method], url, canon['mobile_url'])
+        if result is None:
+            # Un token por pedido: si el tier HTTP ya lo cobró, el navegador sólo ocupa concurrencia.
+            # El turno del throttle va antes que el del scheduler: quien espera por la tasa no retiene
+            # un turno que equivale a un navegador libre.
+            with facebook_slot(charge=not HTTP_TIER_ENABLED) as throttle:
+                # Sólo el trabajo con navegador pasa por el scheduler; cache y tier HTTP no compiten
+                scheduler = get_scheduler()
+                with span('scheduler_wait'):
+                    scheduler.acquire(priority)
+                try:
+                    pool = get_driver_pool(headless=headless)
+                    with span('browser'):
+                        kwargs = {'blocking_profile': blocking_profile, 'mobile_url': canon['mobile_url']}
+                        if HEDGING_ENABLED and priority == HIGH:
+                            # Sólo pedidos interactivos: el trabajo en lote no necesita cortar la cola de latencia
+                            result = get_hedger().run(pool, method, url, **kwargs)
+                        else:
+                            result = pool.run(method, url, **kwargs)
+                        if throttle:
+                            throttle.observe(result)
+                finally:
+                    scheduler.release(priority)
+
+        if result.get('success'):
+            _store(key, result)
+        return result
+
+    return _inflight.do(key, run, timeout=SINGLEFLIGHT_TIMEOUT)
+
+
+def invalidate(kind: str, url: str, blocking_profile: Optional[str] = None):
+    """Descarta el resultado cacheado (p. ej. cuando la URL firmada ya no sirve)"""
+    blocking_profile = blocking_profile or DEFAULT_PROFILES[kind]
+    if blocking_profile != DEFAULT_PROFILES[kind]:
+        kind = f"{kind}@{blocking_profile}"
+    key = cache_key(kind, url)
+    _result_cache.delete(key)
+    store = get_result_store()
+    if store:
+        store.delete(key)
+
+
+def scrape_post(url: str, headless: bool = True, blocking_profile: str = 'post-text', priority: str = HIGH) -> Dict:
+    return _cached_call('post', url, 'scrape_post_by_url', headless, blocking_profile, priority)
+
+
+def scrape_video(url: str, headless: bool = True, blocking_profile: str = 'video', priority: str = HIGH) -> Dict:
+    return _cached_call('video', url, 'scrape_video_by_url', headless, blocking_profile, priority)
+
+
+def iter_page_posts(page_url: str, num_posts: int = 10, headless: bool = True) -> Iterator[Dict]:
+    """Recorre una página y emite eventos a medida que cada post queda listo.
+
+    Eventos: {'type': 'links', ...}, uno {'type': 'post'|'error', 'index', ...}
+    por post en orden de finalización, y {'type': 'done', ...} al final.
+    Los posts se scrapean en paralelo (hasta PAGE_CONCURRENCY navegadores),
+    pasando por la cache, el single-flight y el tier HTTP como cualquier /scrape,
+    pero con prioridad LOW: cada post cede el turno a los pedidos interactivos.
+    """
+    pool = get_driver_pool(headless=headless)
+    with facebook_slot() as throttle, get_scheduler().slot(LOW):
+        collected = pool.run('collect_page_post_links', page_url, num_posts, blocking_profile='feed')
+        if throttle:
+            throttle.observe(collected)
+    if not collected['success']:
+        yield {'type': 'error', 'page_url': page_url, 'error': collected.get('error')}
+        return
+
+    links = collected['links']
+    yield {'type': 'links', 'page_url': page_url, 'total_links': len(links), 'links': links}
+
+    total_posts = 0
+    if links:
+        workers = min(len(links), PAGE_CONCURRENCY or pool.size)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {
+            executor.submit(scrape_post, link, headless, priority=LOW): idx
+            for idx, link in enumerate(links)
+        }
+        try:
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"Error en post {links[idx]}: {e}")
+                    yield {'type': 'error', 'index': idx, 'url': links[idx], 'error': str(e)}
+                    continue
+                if result.get('success'):
+                    total_posts += 1
+                    yield {'type': 'post', 'index': idx, 'url': links[idx], 'post': result['post']}
+                else:
+                    yield {'type': 'error', 'index': idx, 'url': links[idx], 'error': result.get('error')}
+        finally:
+            # Si el cliente se fue (GeneratorExit) los posts que no empezaron no gastan navegadores
+            # ni turnos del throttle; los que ya corren terminan y quedan en la cache
+            pending = [future for future in futures if future.cancel()]
+            if pending:
+                logger.info(f"🛑 Recorrido de {page_url} interrumpido: {len(pending)} posts cancelados")
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    yield {'type': 'done', 'page_url': page_url, 'total_posts': total_posts}
+
+
+def scrape_page(page_url: str, num_posts: int = 10, headless: bool = True) -> Dict:
+    """Igual que iter_page_posts pero acumulando la respuesta completa, en el orden del feed"""
+    posts = {}
+    for event in iter_page_posts(page_url, num_posts, headless):
+        if event['type'] == 'post':
+            posts[event['index']] = event['post']
+        elif event['type'] == 'error' and 'index' not in event:
+            return {'success': False, 'error': event.get('error'), 'page_url': page_url, 'posts': []}
+
+    ordered = [posts[idx] for idx in sorted(posts)]
+    return {
+        'success': True,
+        'page_url': page_url,
+        'total_posts': len(ordered),
+        'posts': ordered
+    }
@@ -4,38 +4,93 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-try:
-    from webdriver_manager.core.utils import ChromeType
-except Exception:
-    try:
-        from webdriver_manager.utils import ChromeType
-    except Exception:
-        ChromeType = None
-import subprocess
-from bs4 import BeautifulSoup
-import json
-import time
+from driver_cache import resolve_chromedriver
+from page_readiness import PageReadiness
+from page_extractor import extract_media, extract_text, extract_in_browser, best_video, make_soup
+from network_capture import NetworkCapture, ScrapeCancelled, is_media_url
+from blocking_profiles import apply_blocking_profile
+from driver_lifecycle import is_fatal_driver_error
+from metrics import span, record_strategy
+from throttle import block_signal, report_signal
+from url_canon import remember_redirect, resolve
 import logging
-import requests
 import os
+import threading
 from typing import Dict, List, Optional
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from http_client import get_http_session, DEFAULT_USER_AGENT, MOBILE_USER_AGENT
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sondeo de candidatos de video
+RANK_MAX_WORKERS = int(os.environ.get('SCRAPER_RANK_WORKERS', '8'))
+VERIFY_MIN_BYTES = 16000
+VERIFY_RANGE_BYTES = VERIFY_MIN_BYTES
+MAX_SIZE_BONUS = 50
+
+# Collector de enlaces del feed: se instala una vez por página y un
+# MutationObserver va acumulando sólo los enlaces a posts agregados al DOM
+_JS_POST_LINK_COLLECTOR = """
+    if (!window.__fbPostCollector) {
+        var c = {seen: new Set(), pending: []};
+        var consider = function(a) {
+            var href = a.getAttribute('href');
+            if (!href || (href.indexOf('/posts/') === -1 && href.indexOf('/photo') === -1)) return;
+            if (!c.seen.has(href)) { c.seen.add(href); c.pending.push(href); }
+        };
+        var scan = function(node) {
+            if (node.nodeType !== 1) return;
+            if (node.tagName === 'A') consider(node);
+            node.querySelectorAll('a[href]').forEach(consider);
+        };
+        scan(document.body);
+        c.observer = new MutationObserver(function(mutations) {
+            mutations.forEach(function(m) {
+                if (m.type === 'attributes') { consider(m.target); return; }
+                m.addedNodes.forEach(scan);
+            });
+        });
+        c.observer.observe(document.body, {childList: true, subtree: true, attributes: true, attributeFilter: ['href']});
+        c.drain = function() { var out = c.pending; c.pending = []; return out; };
+        window.__fbPostCollector = c;
+    }
+    return window.__fbPostCollector.drain();
+"""
+
+# 'browser': un script en la página devuelve sólo lo necesario (ver page_extractor.JS_EXTRACT_MEDIA);
+# 'page_source': se trae el DOM completo y se parsea en Python
+EXTRACTION_MODE = os.environ.get('SCRAPER_EXTRACTION_MODE', 'browser')
+
+# Tier HTTP (sin navegador)
+HTTP_TIER_TIMEOUT = float(os.environ.get('SCRAPER_HTTP_TIER_TIMEOUT', '8'))
+
 
 class FacebookSeleniumScraper:
     """Scraper de Facebook usando Selenium - SIN LOGIN requerido"""
     
-    def __init__(self, headless: bool = True):
+    def __init__(self, headless: bool = True, browser=None):
         self.headless = headless
+        # SharedBrowser (browser_tabs): si está, el scraper usa una pestaña suya en vez de lanzar Chrome
+        self.browser = browser
         self.driver = None
+        self.readiness = None
+        self._last_probes: Dict[str, Dict] = {}
+        self._last_probe_cookies: Optional[Dict[str, str]] = None
+        self.blocking_profile = None
+        # Estado para DriverLifecycle
+        self.navigations = 0
+        self.crashed = False
+        # Lo activa otro hilo para abandonar el scrape en la próxima espera (ver hedging)
+        self.cancel_event = threading.Event()
         
-    def setup_driver(self):
+    def setup_driver(self, extra_args=()):
         """Configura el driver de Chrome"""
+        if self.browser is not None:
+            self._open_tab()
+            return
+
         chrome_options = Options()
         
         if self.headless:
@@ -48,6 +103,8 @@ class FacebookSeleniumScraper:
         chrome_options.add_argument("--disable-gpu")
         chrome_options.add_argument("--window-size=1920,1080")
         chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+        for arg in extra_args:
+            chrome_options.add_argument(arg)
         
         # Deshabilitar notificaciones
         prefs = {
@@ -58,6 +115,9 @@ class FacebookSeleniumScraper:
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option("useAutomationExtension", False)
 
+        # driver.get vuelve en DOMContentLoaded; el resto lo decide PageReadiness
+        chrome_options.page_load_strategy = 'eager'
+
         # Permitir override de la ruta del binario de Chrome
         chrome_bin = os.environ.get('CHROME_BIN')
         if chrome_bin:
@@ -67,45 +127,17 @@ class FacebookSeleniumScraper:
             # Habilitar logging de performance para capturar requests de red
             chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
-            # Detect Chrome/Chromium binary and try to download matching chromedriver
-            chrome_bin = os.environ.get('CHROME_BIN', '/usr/bin/chromium')
-            chrome_version = None
-            try:
-                out = subprocess.check_output([chrome_bin, '--version'], stderr=subprocess.STDOUT, text=True)
-                chrome_version = out.strip()
-                logger.info(f"Detected browser version: {chrome_version}")
-            except Exception:
-                logger.debug("Could not detect chrome binary version via subprocess")
-
-            # Use webdriver-manager specifying Chromium type to better match binary
-            try:
-                if ChromeType is not None:
-                    driver_path = ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()
-                else:
-                    try:
-                        driver_path = ChromeDriverManager(chrome_type='chromium').install()
-                    except Exception:
-                        driver_path = ChromeDriverManager().install()
-
-                logger.info(f"Using chromedriver at: {driver_path}")
-            except Exception as e:
-                logger.warning(f"webdriver-manager failed to install chromedriver with Chromium hint: {e}; falling back to default manager")
-                driver_path = ChromeDriverManager().install()
+            # Ruta de chromedriver y versión del navegador, cacheadas en disco (ver driver_cache)
+            driver_path, chrome_version = resolve_chromedriver(os.environ.get('CHROME_BIN', '/usr/bin/chromium'))
 
             service = Service(driver_path)
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            
-            # Ocultar webdriver
-            try:
-                self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-                    "source": """
-                        Object.defineProperty(navigator, 'webdriver', {
-                            get: () => undefined
-                        })
-                    """
-                })
-            except Exception:
-                pass
+            with span('driver_launch'):
+                self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            self.readiness = PageReadiness(self.driver, cancel=self.cancel_event)
+            self.blocking_profile = None
+            self.navigations = 0
+            self.crashed = False
+            self._hide_webdriver()
             
             logger.info("✅ Driver de Chrome configurado correctamente")
             
@@ -116,51 +148,52 @@ class FacebookSeleniumScraper:
                 logger.error("Sugerencias: asegurarse de que Chromium/Chrome esté instalado en el sistema, o establecer la variable de entorno CHROME_BIN con la ruta al binario.\n- En Render sin Docker, considera usar Playwright (que descarga navegadores) o desplegar con Docker que incluya Chromium.\n- Localmente instala chromium/chrome y asegúrate de que el binario sea accesible para el servicio.")
             raise
 
+    def _hide_webdriver(self):
+        try:
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+                "source": """
+                    Object.defineProperty(navigator, 'webdriver', {
+                        get: () => undefined
+                    })
+                """
+            })
+        except Exception:
+            pass
+
+    def _open_tab(self):
+        with span('tab_open'):
+            self.driver = self.browser.open_tab(cancel=self.cancel_event)
+        self.readiness = PageReadiness(self.driver, cancel=self.cancel_event)
+        self.blocking_profile = None
+        self.navigations = 0
+        self.crashed = False
+        # El script de addScriptToEvaluateOnNewDocument es por pestaña
+        self._hide_webdriver()
+        logger.info("✅ Pestaña abierta en el navegador compartido")
+
     # --- el resto de métodos (igual que en v2) ---
-    def parse_facebook_url(self, url: str) -> Dict[str, Optional[str]]:
+    @staticmethod
+    def parse_facebook_url(url: str) -> Dict[str, Optional[str]]:
+        """Dueño, id y tipo del contenido (ver url_canon); un enlace corto sólo si ya se resolvió"""
         try:
-            parsed = urlparse(url)
-            path = parsed.path
-            
-            result = {'page_name': None, 'post_id': None, 'url_type': None}
-            
-            match = re.search(r'/([^/]+)/posts/([^/?]+)', path)
-            if match:
-                result['page_name'] = match.group(1)
-                result['post_id'] = match.group(2)
-                result['url_type'] = 'post'
-                return result
-            
-            match = re.search(r'/([^/]+)/photos/[^/]+/([^/?]+)', path)
-            if match:
-                result['page_name'] = match.group(1)
-                result['post_id'] = match.group(2)
-                result['url_type'] = 'photo'
-                return result
-            
-            return result
-            
+            canon = resolve(url, fetch=False)
         except Exception as e:
             logger.error(f"Error parseando URL: {e}")
+            canon = {'kind': None, 'needs_resolve': False}
+        if not canon['kind'] or canon['needs_resolve']:
             return {'page_name': None, 'post_id': None, 'url_type': None}
+        return {'page_name': canon['owner'], 'post_id': canon['content_id'], 'url_type': canon['kind']}
 
-    def convert_to_mobile_url(self, url: str) -> str:
-        if not url.startswith('http'):
-            url = 'https://' + url
+    @staticmethod
+    def convert_to_mobile_url(url: str) -> str:
+        """URL móvil directa: sin parámetros de seguimiento y, si es un enlace corto ya resuelto, sin el salto.
 
-        parsed = urlparse(url)
-        netloc = parsed.netloc.lower()
+        No toca la red: resolver enlaces cortos es trabajo de scrape_service (ver url_canon.resolve).
+        """
+        return resolve(url, fetch=False)['mobile_url']
 
-        if netloc.startswith('www.'):
-            netloc = netloc[4:]
-
-        if not netloc.startswith('m.'):
-            netloc = 'm.' + netloc
-
-        mobile_parsed = parsed._replace(netloc=netloc)
-        return urlunparse(mobile_parsed)
-
-    def normalize_video_url(self, url: str) -> str:
+    @staticmethod
+    def normalize_video_url(url: str) -> str:
         try:
             parsed = urlparse(url)
             qs = parse_qsl(parsed.query, keep_blank_values=True)
@@ -170,75 +203,46 @@ class FacebookSeleniumScraper:
         except Exception:
             return url
 
-    def scrape_post_by_url(self, post_url: str) -> Dict:
+    def use_blocking_profile(self, name: Optional[str]):
+        """Activa el perfil de bloqueo de recursos (ver blocking_profiles) si cambió"""
+        if name and name != self.blocking_profile:
+            if apply_blocking_profile(self.driver, name):
+                self.blocking_profile = name
+
+    def scrape_post_by_url(self, post_url: str, blocking_profile: str = 'post-text', mobile_url: Optional[str] = None) -> Dict:
         if not self.driver:
             self.setup_driver()
+        self.use_blocking_profile(blocking_profile)
         
         try:
-            mobile_url = self.convert_to_mobile_url(post_url)
+            mobile_url = mobile_url or self.convert_to_mobile_url(post_url)
             
             logger.info(f"🔍 Accediendo a: {mobile_url}")
-            self.driver.get(mobile_url)
-            time.sleep(3)
+            self.navigations += 1
+            with span('driver_get'):
+                self.driver.get(mobile_url)
+            with span('wait_dom_ready'):
+                self.readiness.wait_for_dom_ready()
+            blocked = self._check_landing(post_url)
+            if blocked:
+                return {'success': False, 'error': self._blocked_error(blocked), 'blocked': blocked, 'url': post_url, 'post': None}
+            with span('wait_content'):
+                self.readiness.wait_for_content()
             
             self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-            
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            
-            images = []
-            img_tags = soup.find_all('img')
-            
-            for img in img_tags:
-                src = img.get('src')
-                if src and 'scontent' in src:
-                    if not any(x in src for x in ['emoji', 'static', 'safe_image', 'rsrc.php']):
-                        if src not in images:
-                            images.append(src)
-            
-            for img in soup.find_all('img', attrs={'data-src': True}):
-                src = img.get('data-src')
-                if src and 'scontent' in src and src not in images:
-                    images.append(src)
-            
-            post_text = ""
-            try:
-                text_divs = soup.find_all('div', {'data-ft': True})
-                for div in text_divs:
-                    text = div.get_text(strip=True)
-                    if len(text) > 20 and len(text) > len(post_text):
-                        post_text = text
-                
-                if not post_text:
-                    all_text = soup.get_text()
-                    lines = [line.strip() for line in all_text.split('\n') if len(line.strip()) > 30]
-                    if lines:
-                        post_text = lines[0]
-                        
-            except Exception as e:
-                logger.warning(f"No se pudo extraer texto: {e}")
+            with span('wait_scroll_stable'):
+                self.readiness.wait_for_scroll_stable()
             
-            parsed_info = self.parse_facebook_url(post_url)
-            
-            result = {
-                'success': True,
-                'url': post_url,
-                'mobile_url': mobile_url,
-                'parsed': parsed_info,
-                'post': {
-                    'text': post_text[:500] if post_text else "",
-                    'images': [{'url': img} for img in images],
-                    'total_images': len(images),
-                    'page_name': parsed_info.get('page_name'),
-                    'post_id': parsed_info.get('post_id')
-                }
-            }
+            extraction = self.extract_page(with_text=True)
+            images, post_text = extraction['images'], extraction['text']
+            result = self._build_post_result(post_url, mobile_url, images, post_text, tier='browser')
             
             logger.info(f"✅ Encontradas {len(images)} imágenes")
             return result
             
         except Exception as e:
             logger.error(f"❌ Error scrapeando post: {e}")
+            self._note_error(e)
             return {
                 'success': False,
                 'error': str(e),
@@ -246,110 +250,324 @@ class FacebookSeleniumScraper:
                 'post': None
             }
 
-    def extract_video_url(self, soup, page_source: Optional[str] = None) -> Optional[str]:
+    def _check_landing(self, requested_url: str) -> Optional[str]:
+        """Anota adónde llevó un enlace corto y devuelve la señal de throttle si cayó en login/checkpoint"""
         try:
-            meta = soup.find('meta', property='og:video') or soup.find('meta', property='og:video:url')
-            if meta and meta.get('content'):
-                return meta.get('content')
-
-            video_tag = soup.find('video')
-            if video_tag:
-                src = video_tag.get('src') or video_tag.get('data-src')
-                if src:
-                    return src
-
-                source = video_tag.find('source') if video_tag else None
-                if source and source.get('src'):
-                    return source.get('src')
-
-            if page_source:
-                m = re.search(r'"playable_url":"(https:[^\"]+)"', page_source)
-                if m:
-                    return m.group(1).replace('\\u0025','%')
-
-                for pattern in [
-                    r'"playable_url_quality_hd":"(https:[^\"]+)"',
-                    r'"playable_url_quality_sd":"(https:[^\"]+)"',
-                    r'"hd_src":"(https:[^\"]+)"',
-                    r'"sd_src":"(https:[^\"]+)"',
-                    r'"sd_src_no_ratelimit":"(https:[^\"]+)"',
-                    r'"hd_src_no_ratelimit":"(https:[^\"]+)"',
-                    r'"fallback_playable_url":"(https:[^\"]+)"',
-                    r'src\\":\"(https://video[^\"]+)'
-                ]:
-                    mm = re.search(pattern, page_source)
-                    if mm:
-                        return mm.group(1).replace('\\u0025','%')
-
-            for a in soup.find_all('a', href=True):
-                href = a['href']
-                if 'video.php' in href or ('play' in href and 'fbcdn' in href):
-                    if href.startswith('/'):
-                        return 'https://m.facebook.com' + href
-                    return href
-
-            m_fbcdn = re.search(r'(https://[a-z0-9.\-]*fbcdn\.net[^"\'\>\s]+)', page_source or '')
-            if m_fbcdn:
-                return m_fbcdn.group(1)
+            final_url = self.driver.current_url
+        except Exception:
+            return None
+        blocked = block_signal(final_url)
+        if not blocked:
+            remember_redirect(requested_url, final_url)
+        return blocked
+
+    def _has_post_markup(self) -> bool:
+        """Marcado de post en la página cargada; ante la duda se asume que sí"""
+        try:
+            return bool(self.driver.execute_script(
+                "return !!document.querySelector('[data-ft], article, [data-sigil*=\"story\"]');"
+            ))
+        except Exception:
+            return True
+
+    @staticmethod
+    def _blocked_error(blocked: str) -> str:
+        return f"Facebook pidió {'login' if blocked == 'login_wall' else 'verificación'} en vez de mostrar el contenido"
 
+    def extract_page(self, with_text: bool = False) -> Dict:
+        """Videos, imágenes, og:image (y texto) de la página cargada en el navegador.
+
+        En modo 'browser' se resuelve con un solo script en la página; si falla
+        o el modo es 'page_source', se parsea el DOM completo en Python.
+        """
+        if EXTRACTION_MODE == 'browser':
+            with span('extract_in_browser'):
+                extraction = extract_in_browser(self.driver)
+            if extraction is not None:
+                return extraction
+
+        with span('page_source'):
+            page_source = self.driver.page_source
+        with span('extract_media'):
+            extraction = extract_media(page_source)
+        if with_text:
+            with span('extract_text'):
+                extraction['text'] = extract_text(make_soup(page_source))
+        return extraction
+
+    def extract_post_content(self, page_source: str):
+        """Imágenes (scontent) y texto principal de un post"""
+        with span('extract_media'):
+            extraction = extract_media(page_source)
+        with span('extract_text'):
+            post_text = extract_text(make_soup(page_source))
+        return extraction['images'], post_text
+
+    def _build_post_result(self, post_url: str, mobile_url: str, images: List[str], post_text: str, tier: str) -> Dict:
+        parsed_info = self.parse_facebook_url(post_url)
+        return {
+            'success': True,
+            'url': post_url,
+            'mobile_url': mobile_url,
+            'tier': tier,
+            'parsed': parsed_info,
+            'post': {
+                'text': post_text[:500] if post_text else "",
+                'images': [{'url': img} for img in images],
+                'total_images': len(images),
+                'page_name': parsed_info.get('page_name'),
+                'post_id': parsed_info.get('post_id')
+            }
+        }
+
+    # --- Tier HTTP: sin navegador ---
+    def fetch_html(self, url: str) -> Optional[str]:
+        """Descarga el HTML móvil de un post con la sesión HTTP compartida.
+
+        Devuelve None si Facebook responde con error o redirige al login.
+        """
+        try:
+            with span('http_fetch'):
+                r = get_http_session().get(
+                    url,
+                    headers={"User-Agent": MOBILE_USER_AGENT, "Accept-Language": "es-ES,es;q=0.9,en;q=0.8"},
+                    allow_redirects=True,
+                    timeout=HTTP_TIER_TIMEOUT,
+                )
+        except Exception as e:
+            logger.debug(f"Tier HTTP: fallo descargando {url}: {e}")
+            return None
+
+        blocked = block_signal(r.url)
+        if r.status_code in (403, 429):
+            blocked = f'http_{r.status_code}'
+        if blocked:
+            report_signal(blocked)
+        if r.status_code != 200 or blocked:
+            logger.debug(f"Tier HTTP: {url} -> {r.status_code} {r.url}")
+            return None
+        return r.text
+
+    @staticmethod
+    def _looks_like_video_url(url: Optional[str]) -> bool:
+        if not url or url.startswith('blob:'):
+            return False
+        low = url.lower()
+        return '.mp4' in low or '.m3u8' in low or 'video' in urlparse(low).netloc
+
+    def scrape_post_via_http(self, post_url: str, mobile_url: Optional[str] = None) -> Optional[Dict]:
+        """Intenta resolver el post sólo con HTTP; None si hace falta el navegador"""
+        mobile_url = mobile_url or self.convert_to_mobile_url(post_url)
+        page_source = self.fetch_html(mobile_url)
+        if not page_source:
+            return None
+
+        has_post_markup = 'data-ft' in page_source
+        if not has_post_markup and 'id="login_form"' in page_source:
+            return None
+
+        images, post_text = self.extract_post_content(page_source)
+        if not images:
+            # /scrape y /scrape/images-only necesitan las imágenes: si el servidor no las renderizó
+            # (las pone el JS), una lista vacía no se cachea y decide el navegador
+            return None
+
+        logger.info(f"⚡ Tier HTTP: {len(images)} imágenes para {mobile_url}")
+        return self._build_post_result(post_url, mobile_url, images, post_text, tier='http')
+
+    def scrape_video_via_http(self, post_url: str, mobile_url: Optional[str] = None) -> Optional[Dict]:
+        """Intenta resolver la URL del video sólo con HTTP; None si hace falta el navegador"""
+        mobile_url = mobile_url or self.convert_to_mobile_url(post_url)
+        page_source = self.fetch_html(mobile_url)
+        if not page_source:
+            return None
+
+        with span('extract_media'):
+            extraction = extract_media(page_source)
+        video = best_video(extraction)
+        video_url = video['url'] if video else None
+        if not self._looks_like_video_url(video_url):
+            return None
+
+        with span('probe'):
+            probe = self.probe_video_url(video_url, referer=post_url)
+        if not probe.get('ok'):
+            return None
+
+        logger.info(f"⚡ Tier HTTP: video encontrado para {mobile_url}")
+        record_strategy('video', video['source'])
+        return {
+            'success': True,
+            'url': post_url,
+            'mobile_url': mobile_url,
+            'tier': 'http',
+            'strategy': video['source'],
+            'video_url': video_url,
+            'variants': self.video_variants(extraction),
+            'probe': probe,
+            'probe_mobile': None
+        }
+
+    def extract_video_url(self, soup=None, page_source: Optional[str] = None) -> Optional[str]:
+        try:
+            if page_source is None:
+                page_source = str(soup) if soup is not None else ''
+            video = best_video(extract_media(page_source))
+            if video:
+                return video['url']
         except Exception as e:
             logger.warning(f"Error extrayendo video: {e}")
 
         return None
 
+    @staticmethod
+    def video_variants(extraction: Dict) -> List[Dict]:
+        """Variantes de video con su calidad, sin el fallback genérico de URLs fbcdn"""
+        return [v for v in extraction.get('videos', []) if v['source'] != 'fbcdn']
+
+    @staticmethod
+    def _static_video_score(url: str) -> float:
+        score = 0
+        low = url.lower()
+        if '.mp4' in low or '.m3u8' in low:
+            score += 100
+        if 'video.fsci' in low:
+            score += 50
+        if 'fbcdn.net' in low:
+            score += 30
+        if '_nc_ht=video' in low or 'nc_ht=video' in low:
+            score += 20
+        if 'bytestart=' in low or 'byteend=' in low:
+            score -= 40
+        return score
+
+    def _probe_candidate(self, url: str, headers: Dict[str, str], cookies: Optional[Dict[str, str]] = None, verify: bool = True) -> Dict:
+        """HEAD + GET parcial sobre la sesión compartida.
+
+        Devuelve el mismo dict que probe_video_url, más 'size_mb' y 'verified'
+        (el rango inicial trae más de VERIFY_MIN_BYTES, es decir, no es un stub).
+        """
+        session = get_http_session()
+        probe = {
+            "ok": False,
+            "status": None,
+            "content_type": None,
+            "content_length": None,
+            "used_referer": headers.get("Referer"),
+            "error": None,
+            "size_mb": 0.0,
+            "verified": False,
+        }
+
+        try:
+            r = session.head(url, headers=headers, cookies=cookies, allow_redirects=True, timeout=5)
+            probe["status"] = r.status_code
+            probe["content_type"] = r.headers.get("Content-Type")
+            probe["content_length"] = r.headers.get("Content-Length")
+            cl = r.headers.get('Content-Length')
+            if cl and cl.isdigit():
+                probe["size_mb"] = int(cl) / (1024 * 1024)
+            if r.status_code in (200, 206):
+                probe["ok"] = True
+                if not verify:
+                    return probe
+        except Exception as e:
+            probe["error"] = str(e)
+
+        headers_range = dict(headers)
+        headers_range["Range"] = f"bytes=0-{VERIFY_RANGE_BYTES}"
+        try:
+            with session.get(url, headers=headers_range, cookies=cookies, allow_redirects=True, timeout=8, stream=True) as r:
+                # El rango es pequeño: se lee completo para devolver la conexión al pool
+                received = 0
+                for chunk in r.iter_content(chunk_size=16384):
+                    received += len(chunk)
+                cl = r.headers.get('Content-Length')
+                cl_val = int(cl) if cl and cl.isdigit() else 0
+                probe["verified"] = received > VERIFY_MIN_BYTES or cl_val > VERIFY_MIN_BYTES
+                if not probe["ok"]:
+                    probe["status"] = r.status_code
+                    probe["content_type"] = r.headers.get("Content-Type")
+                    probe["content_length"] = r.headers.get("Content-Length")
+                    probe["ok"] = r.status_code in (200, 206)
+        except Exception as e:
+            if not probe.get("error"):
+                probe["error"] = str(e)
+
+        return probe
+
     def rank_video_candidates(self, candidates: List[str], referer: Optional[str] = None, cookies: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """Elige el mejor candidato sondeándolos en paralelo.
+
+        Puntaje = heurística de la URL + tamaño (hasta 50 MB). Gana el candidato
+        verificado con mayor puntaje; se corta en cuanto ningún candidato
+        pendiente puede superarlo. Los sondeos quedan en self._last_probes para
+        que probe_video_url no repita la petición del ganador.
+        """
+        self._last_probes = {}
+        self._last_probe_cookies = cookies
         if not candidates:
             return None
 
-        scores = {}
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+        headers = {"User-Agent": DEFAULT_USER_AGENT}
         if referer:
             headers["Referer"] = referer
 
-        for url in set(candidates):
-            score = 0
-            low = url.lower()
-            if '.mp4' in low or '.m3u8' in low:
-                score += 100
-            if 'video.fsci' in low:
-                score += 50
-            if 'fbcdn.net' in low:
-                score += 30
-            if '_nc_ht=video' in low or 'nc_ht=video' in low:
-                score += 20
-            if 'bytestart=' in low or 'byteend=' in low:
-                score -= 40
-
-            size_mb = 0.0
-            try:
-                r = requests.head(url, headers=headers, cookies=cookies, allow_redirects=True, timeout=5)
-                cl = r.headers.get('Content-Length')
-                if cl and cl.isdigit():
-                    size_mb = int(cl) / (1024 * 1024)
-                    score += min(50, size_mb)
-            except Exception:
-                pass
+        unique = list(set(candidates))
+        static = {url: self._static_video_score(url) for url in unique}
+        scores = dict(static)
 
-            scores[url] = score
+        def rank_key(url: str):
+            return (scores[url], len(url))
 
-        ordered = sorted(scores.items(), key=lambda kv: (kv[1], len(kv[0])), reverse=True)
+        def upper_bound(url: str):
+            return (static[url] + MAX_SIZE_BONUS, len(url))
 
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)", 'Range': 'bytes=0-200000'}
-        if referer:
-            headers["Referer"] = referer
-        for url, sc in ordered:
-            try:
-                r = requests.get(url, headers=headers, cookies=cookies, allow_redirects=True, timeout=8)
-                content_len = len(r.content) if r.content is not None else 0
-                cl = r.headers.get('Content-Length')
-                cl_val = int(cl) if cl and cl.isdigit() else 0
-                if content_len > 16000 or cl_val > 16000:
-                    return url
-            except Exception:
-                continue
+        executor = ThreadPoolExecutor(max_workers=min(RANK_MAX_WORKERS, len(unique)))
+        futures = {executor.submit(self._probe_candidate, url, headers, cookies): url for url in unique}
+        pending = set(unique)
+        winner = None
+        try:
+            for future in as_completed(futures):
+                # Un intento que perdió el hedge no espera los sondeos que quedan
+                if self.cancel_event.is_set():
+                    raise ScrapeCancelled('Scrape cancelado durante el sondeo de candidatos')
+                url = futures[future]
+                pending.discard(url)
+                try:
+                    probe = future.result()
+                except Exception:
+                    continue
+                self._last_probes[url] = probe
+                scores[url] = static[url] + min(MAX_SIZE_BONUS, probe["size_mb"])
 
-        best = max(scores.items(), key=lambda kv: (kv[1], len(kv[0])))
-        return best[0]
+                verified = [u for u, p in self._last_probes.items() if p["verified"]]
+                if not verified:
+                    continue
+                best = max(verified, key=rank_key)
+                if all(upper_bound(p) < rank_key(best) for p in pending):
+                    winner = best
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # fbcdn también frena: 429 es inequívoco; 403 puede ser una firma vencida, así que sólo cuenta si fallaron todos
+        statuses = [probe.get('status') for probe in self._last_probes.values()]
+        if 429 in statuses:
+            report_signal('http_429')
+        elif statuses and all(status == 403 for status in statuses):
+            report_signal('http_403')
+
+        if winner:
+            if pending:
+                logger.info(f"🏁 Candidato elegido sin esperar {len(pending)} sondeos")
+            return winner
+
+        # El último sondeo pudo fallar sin pasar por el corte: un verificado siempre gana a uno sin verificar
+        verified = [u for u, p in self._last_probes.items() if p["verified"]]
+        if verified:
+            return max(verified, key=rank_key)
+        return max(scores, key=rank_key)
 
     def _get_requests_cookies(self) -> Dict[str, str]:
         try:
@@ -364,184 +582,167 @@ class FacebookSeleniumScraper:
             return {}
 
     def probe_video_url(self, url: str, referer: Optional[str] = None, cookies: Optional[Dict[str, str]] = None, extra_headers: Optional[Dict[str, str]] = None) -> Dict:
+        # Reutilizar el sondeo hecho durante el ranking sólo si fue con los mismos headers y cookies
+        ranked = self._last_probes.get(url)
+        same_request = not extra_headers and cookies == self._last_probe_cookies
+        if ranked and ranked.get("ok") and same_request and ranked.get("used_referer") == (referer or None):
+            return {k: v for k, v in ranked.items() if k not in ("size_mb", "verified")}
+
         headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+            "User-Agent": DEFAULT_USER_AGENT,
         }
         if referer:
             headers["Referer"] = referer
         if extra_headers:
             headers.update(extra_headers)
 
-        result = {
-            "ok": False,
-            "status": None,
-            "content_type": None,
-            "content_length": None,
-            "used_referer": referer or None,
-            "error": None,
-        }
+        probe = self._probe_candidate(url, headers, cookies, verify=False)
+        probe["used_referer"] = referer or None
+        probe.pop("size_mb", None)
+        probe.pop("verified", None)
+        return probe
 
+    def _play_video(self):
         try:
-            r = requests.head(url, headers=headers, cookies=cookies, allow_redirects=True, timeout=8)
-            result["status"] = r.status_code
-            result["content_type"] = r.headers.get("Content-Type")
-            result["content_length"] = r.headers.get("Content-Length")
-            if r.status_code in (200, 206):
-                result["ok"] = True
-                return result
-        except Exception as e:
-            result["error"] = str(e)
+            self.driver.execute_script("var v=document.querySelector('video'); if(v){v.play();}")
+        except Exception:
+            pass
 
+    def _performance_entries(self, media_only: bool = True) -> List[str]:
+        """URLs de performance.getEntries(); respaldo cuando no hay log de performance"""
         try:
-            headers_range = dict(headers)
-            headers_range["Range"] = "bytes=0-200000"
-            r = requests.get(url, headers=headers_range, cookies=cookies, allow_redirects=True, timeout=8)
-            result["status"] = r.status_code
-            result["content_type"] = r.headers.get("Content-Type")
-            result["content_length"] = r.headers.get("Content-Length")
-            if r.status_code in (200, 206):
-                result["ok"] = True
+            try:
+                entries = self.driver.execute_script("return performance.getEntriesByType('resource').map(e => e.name);")
+            except Exception:
+                entries = self.driver.execute_script("return performance.getEntries().map(e => e.name || e.entryType || '');")
         except Exception as e:
-            if not result.get("error"):
-                result["error"] = str(e)
+            logger.debug(f"No se pudo obtener performance entries: {e}")
+            return []
 
-        return result
+        urls = []
+        for ent in entries or []:
+            if not ent or ent.startswith('blob:'):
+                continue
+            if media_only:
+                if not is_media_url(ent):
+                    continue
+                normalized = self.normalize_video_url(ent)
+                if normalized != ent:
+                    urls.append(normalized)
+            urls.append(ent)
+        return urls
 
-    def scrape_video_by_url(self, post_url: str) -> Dict:
+    def scrape_video_by_url(self, post_url: str, blocking_profile: str = 'video', mobile_url: Optional[str] = None) -> Dict:
         if not self.driver:
             self.setup_driver()
+        self.use_blocking_profile(blocking_profile)
 
         try:
-            mobile_url = self.convert_to_mobile_url(post_url)
+            mobile_url = mobile_url or self.convert_to_mobile_url(post_url)
             logger.info(f"🔍 Accediendo (video): {mobile_url}")
-            self.driver.get(mobile_url)
-            time.sleep(3)
-
-            page_source = self.driver.page_source
-            soup = BeautifulSoup(page_source, 'html.parser')
-
-            video_url = self.extract_video_url(soup, page_source=page_source)
+            capture = NetworkCapture(self.driver, normalize=self.normalize_video_url, cancel=self.cancel_event)
+            capture.start()
+            self.navigations += 1
+            with span('driver_get'):
+                self.driver.get(mobile_url)
+            with span('wait_dom_ready'):
+                self.readiness.wait_for_dom_ready()
+            blocked = self._check_landing(post_url)
+            if blocked:
+                return {'success': False, 'error': self._blocked_error(blocked), 'blocked': blocked, 'url': post_url, 'video_url': None}
+            # Lo que llegue primero: el <video>/og:video en el DOM o una respuesta de media
+            with span('wait_video'):
+                self.readiness.wait_for_video(stop_when=capture.poll)
+
+            extraction = self.extract_page()
+            video = best_video(extraction)
+            video_url = video['url'] if video else None
 
             candidates = set()
-            network_headers = {}
             if video_url and not str(video_url).startswith('blob:'):
                 candidates.add(video_url)
 
-            try:
-                try:
-                    self.driver.execute_script("var v=document.querySelector('video'); if(v){v.play();}")
-                except Exception:
-                    pass
-                time.sleep(3)
-                try:
-                    entries = self.driver.execute_script("return performance.getEntriesByType('resource').map(e => e.name);")
-                except Exception:
-                    entries = self.driver.execute_script("return performance.getEntries().map(e => e.name || e.entryType || '');")
-
-                if entries:
-                    for ent in entries:
-                        if not ent:
-                            continue
-                        if ent.startswith('blob:'):
-                            continue
-                        low = ent.lower()
-                        if '.mp4' in low or '.m3u8' in low or 'video.fsci' in low:
-                            candidates.add(ent)
-                            normalized = self.normalize_video_url(ent)
-                            if normalized != ent:
-                                candidates.add(normalized)
-            except Exception:
-                pass
+            deadlines = self.readiness.deadlines
+            if not capture.usable:
+                self._play_video()
+                with span('wait_media_request'):
+                    if capture.available:
+                        capture.wait_for_media(deadlines['media_request'])
+                    else:
+                        self.readiness.wait_for_media_request()
+                        candidates.update(self._performance_entries(media_only=True))
+
+            if not video_url and not capture.usable:
+                self._play_video()
+                with span('wait_media_request_fallback'):
+                    if capture.available:
+                        capture.wait_for_media(deadlines['media_request_fallback'])
+                    else:
+                        self.readiness.wait_for_media_request(stage='media_request_fallback')
+                        candidates.update(self._performance_entries(media_only=False))
 
-            if not video_url:
-                try:
-                    try:
-                        self.driver.execute_script("var v=document.querySelector('video'); if(v){v.play();}")
-                    except Exception:
-                        pass
-
-                    time.sleep(4)
-
-                    try:
-                        entries = self.driver.execute_script("return performance.getEntriesByType('resource').map(e => e.name);")
-                    except Exception:
-                        entries = self.driver.execute_script("return performance.getEntries().map(e => e.name || e.entryType || '');")
-
-                    if entries:
-                        for ent in entries:
-                            if not ent:
-                                continue
-                            if ent.startswith('blob:'):
-                                continue
-                            candidates.add(ent)
-                except Exception as e:
-                    logger.debug(f"No se pudo obtener performance entries: {e}")
-
-                try:
-                    logs = self.driver.get_log('performance')
-                    for entry in logs:
-                        try:
-                            msg = json.loads(entry['message'])['message']
-                            method = msg.get('method', '')
-                            params = msg.get('params', {})
-                            if method == 'Network.requestWillBeSent':
-                                req = params.get('request', {})
-                                url_seen = req.get('url')
-                                if url_seen and not url_seen.startswith('blob:'):
-                                    low = url_seen.lower()
-                                    if '.mp4' in low or '.m3u8' in low or 'video.fsci' in low:
-                                        candidates.add(url_seen)
-                                        normalized = self.normalize_video_url(url_seen)
-                                        if normalized != url_seen:
-                                            candidates.add(normalized)
-                                    hdrs = req.get('headers', {}) or {}
-                                    if isinstance(hdrs, dict):
-                                        network_headers[url_seen] = {k: str(v) for k, v in hdrs.items()}
-                            elif method == 'Network.responseReceived':
-                                url_seen = params.get('response', {}).get('url')
-                                if url_seen and not url_seen.startswith('blob:'):
-                                    low = url_seen.lower()
-                                    if '.mp4' in low or '.m3u8' in low or 'video.fsci' in low:
-                                        candidates.add(url_seen)
-                                        normalized = self.normalize_video_url(url_seen)
-                                        if normalized != url_seen:
-                                            candidates.add(normalized)
-                        except Exception:
-                            continue
-                except Exception as e:
-                    logger.debug(f"No se pudo leer performance logs: {e}")
+            candidates.update(capture.candidates)
+            network_headers = capture.headers
 
             if candidates:
                 cookie_jar = self._get_requests_cookies()
-                best = self.rank_video_candidates(list(candidates), referer=post_url, cookies=cookie_jar)
+                with span('rank_candidates'):
+                    best = self.rank_video_candidates(list(candidates), referer=post_url, cookies=cookie_jar)
                 if best:
                     extra_headers = network_headers.get(best)
-                    probe = self.probe_video_url(best, referer=post_url, cookies=cookie_jar, extra_headers=extra_headers)
-                    if not probe.get('ok'):
-                        probe_mobile = self.probe_video_url(best, referer=mobile_url, cookies=cookie_jar, extra_headers=extra_headers)
+                    with span('probe'):
+                        probe = self.probe_video_url(best, referer=post_url, cookies=cookie_jar, extra_headers=extra_headers)
+                        if not probe.get('ok'):
+                            probe_mobile = self.probe_video_url(best, referer=mobile_url, cookies=cookie_jar, extra_headers=extra_headers)
+                        else:
+                            probe_mobile = None
+                    if best == video_url:
+                        strategy = video['source']
+                    elif best in capture.candidates:
+                        strategy = 'network_log'
                     else:
-                        probe_mobile = None
+                        strategy = 'performance_entries'
+                    record_strategy('video', strategy)
                     return {
                         'success': True,
                         'url': post_url,
                         'mobile_url': mobile_url,
+                        'tier': 'browser',
+                        'strategy': strategy,
                         'video_url': best,
+                        'variants': self.video_variants(extraction),
                         'probe': probe,
                         'probe_mobile': probe_mobile
                     }
 
             if not video_url:
-                return {'success': False, 'error': 'Video no encontrado', 'url': post_url, 'video_url': None}
+                record_strategy('video', 'none')
+                # Sin video en un post de fotos o texto es normal; sólo una página vacía sugiere bloqueo
+                empty_page = (not extraction['images'] and not extraction.get('og_image')
+                              and not extraction.get('text') and not self._has_post_markup())
+                return {'success': False, 'error': 'Video no encontrado', 'url': post_url, 'video_url': None, 'empty_page': empty_page}
 
-            return {'success': True, 'url': post_url, 'mobile_url': mobile_url, 'video_url': video_url}
+            record_strategy('video', video['source'])
+            return {
+                'success': True,
+                'url': post_url,
+                'mobile_url': mobile_url,
+                'tier': 'browser',
+                'strategy': video['source'],
+                'video_url': video_url,
+                'variants': self.video_variants(extraction)
+            }
 
         except Exception as e:
             logger.error(f"❌ Error scrapando video: {e}")
+            self._note_error(e)
             return {'success': False, 'error': str(e), 'url': post_url, 'video_url': None}
     
-    def scrape_page_posts(self, page_url: str, num_posts: int = 10) -> Dict:
+    def collect_page_post_links(self, page_url: str, num_posts: int = 10, blocking_profile: str = 'feed') -> Dict:
+        """Recorre el feed de la página y devuelve hasta num_posts enlaces a posts, en orden de aparición"""
         if not self.driver:
             self.setup_driver()
+        self.use_blocking_profile(blocking_profile)
         
         try:
             if not page_url.startswith('http'):
@@ -550,82 +751,152 @@ class FacebookSeleniumScraper:
                 mobile_url = self.convert_to_mobile_url(page_url)
             
             logger.info(f"🔍 Accediendo a página: {mobile_url}")
-            self.driver.get(mobile_url)
-            time.sleep(3)
+            self.navigations += 1
+            with span('driver_get'):
+                self.driver.get(mobile_url)
+            with span('wait_dom_ready'):
+                self.readiness.wait_for_dom_ready()
+            blocked = self._check_landing(page_url)
+            if blocked:
+                return {'success': False, 'error': self._blocked_error(blocked), 'blocked': blocked, 'page_url': page_url, 'links': []}
+            with span('wait_content'):
+                self.readiness.wait_for_content()
             
-            posts_found = set()
+            # dict como conjunto ordenado
+            posts_found: Dict[str, None] = {}
+
+            def add_links(hrefs: List[str]):
+                for href in hrefs:
+                    if len(posts_found) >= num_posts:
+                        break
+                    full_url = f"https://m.facebook.com{href}" if href.startswith('/') else href
+                    posts_found.setdefault(full_url.split('?')[0])
+
+            # El collector del lado del navegador acumula sólo los enlaces nuevos;
+            # si no se puede inyectar se vuelve a parsear page_source en cada scroll
+            use_collector = True
+            try:
+                add_links(self.driver.execute_script(_JS_POST_LINK_COLLECTOR) or [])
+            except Exception as e:
+                logger.debug(f"No se pudo instalar el collector de enlaces: {e}")
+                use_collector = False
+
             scroll_attempts = 0
-            max_scrolls = num_posts // 2 + 2
+            max_scrolls = num_posts * 2 + 5
             
             while len(posts_found) < num_posts and scroll_attempts < max_scrolls:
+                previous_height = self.readiness.scroll_height()
                 self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
+                with span('feed_scroll'):
+                    grew = self.readiness.wait_for_height_change(previous_height)
                 scroll_attempts += 1
-                
-                soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-                links = soup.find_all('a', href=True)
-                
-                for link in links:
-                    href = link['href']
-                    if '/posts/' in href or '/photo' in href:
-                        if href.startswith('/'):
-                            full_url = f"https://m.facebook.com{href}"
-                        else:
-                            full_url = href
-                        
-                        clean_url = full_url.split('?')[0]
-                        posts_found.add(clean_url)
-                        
-                        if len(posts_found) >= num_posts:
-                            break
+
+                if use_collector:
+                    add_links(self.driver.execute_script("return window.__fbPostCollector.drain();") or [])
+                else:
+                    soup = make_soup(self.driver.page_source)
+                    add_links([
+                        link['href'] for link in soup.find_all('a', href=True)
+                        if '/posts/' in link['href'] or '/photo' in link['href']
+                    ])
+
+                if not grew:
+                    # El feed dejó de crecer: no hay más posts que cargar
+                    break
             
             logger.info(f"📝 Encontrados {len(posts_found)} enlaces a posts")
-            
-            posts_data = []
-            for idx, post_url in enumerate(list(posts_found)[:num_posts]):
-                logger.info(f"📥 Scrapeando post {idx + 1}/{num_posts}")
-                try:
-                    post_result = self.scrape_post_by_url(post_url)
-                    if post_result['success']:
-                        posts_data.append(post_result['post'])
-                    time.sleep(2)  
-                except Exception as e:
-                    logger.warning(f"Error en post {post_url}: {e}")
-                    continue
-            
             return {
                 'success': True,
                 'page_url': page_url,
-                'total_posts': len(posts_data),
-                'posts': posts_data
+                'mobile_url': mobile_url,
+                'links': list(posts_found)[:num_posts]
             }
             
         except Exception as e:
             logger.error(f"❌ Error scrapeando página: {e}")
+            self._note_error(e)
             return {
                 'success': False,
                 'error': str(e),
                 'page_url': page_url,
+                'links': []
+            }
+
+    def scrape_page_posts(self, page_url: str, num_posts: int = 10, blocking_profile: str = 'feed') -> Dict:
+        """Versión secuencial con un solo navegador; la API usa scrape_service.iter_page_posts"""
+        collected = self.collect_page_post_links(page_url, num_posts, blocking_profile=blocking_profile)
+        if not collected['success']:
+            return {
+                'success': False,
+                'error': collected.get('error'),
+                'page_url': page_url,
                 'posts': []
             }
-    
-    def close(self):
-        if self.driver:
-            self.driver.quit()
-            logger.info("🔒 Navegador cerrado")
 
+        posts_data = []
+        links = collected['links']
+        for idx, post_url in enumerate(links):
+            logger.info(f"📥 Scrapeando post {idx + 1}/{len(links)}")
+            try:
+                post_result = self.scrape_post_by_url(post_url)
+                if post_result['success']:
+                    posts_data.append(post_result['post'])
+            except Exception as e:
+                logger.warning(f"Error en post {post_url}: {e}")
+                continue
+        
+        return {
+            'success': True,
+            'page_url': page_url,
+            'total_posts': len(posts_data),
+            'posts': posts_data
+        }
+    
+    def _note_error(self, error):
+        if is_fatal_driver_error(error):
+            self.crashed = True
+
+    def browser_pid(self) -> Optional[int]:
+        """PID de chromedriver (raíz del árbol de procesos de Chrome)"""
+        if self.browser is not None:
+            # Chrome es compartido: su RSS no dice nada de esta pestaña
+            return None
+        try:
+            return self.driver.service.process.pid
+        except Exception:
+            return None
 
-# Singleton para reutilizar el scraper
-_scraper_instance = None
+    def reset_session(self):
+        """Borra cookies, cache y la página actual para que el próximo lease empiece limpio"""
+        if self.browser is not None and getattr(self.driver, 'isolated', False):
+            # Descartar el browser context y abrir otro es más barato y más limpio que vaciarlo
+            try:
+                self.close()
+                self.setup_driver()
+            except Exception as e:
+                logger.debug(f"No se pudo renovar la pestaña: {e}")
+                self._note_error(e)
+            return
+        try:
+            self.driver.delete_all_cookies()
+            self.driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            self.driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+            self.driver.get('about:blank')
+        except Exception as e:
+            logger.debug(f"No se pudo limpiar la sesión: {e}")
+            self._note_error(e)
 
-def get_scraper_instance(headless: bool = True) -> FacebookSeleniumScraper:
-    global _scraper_instance
-    if _scraper_instance is None:
-        _scraper_instance = FacebookSeleniumScraper(headless=headless)
-    return _scraper_instance
+    def restart_driver(self):
+        self.close()
+        self.setup_driver()
 
-def close_scraper_instance():
-    global _scraper_instance
-    if _scraper_instance:
-        _scraper_instance.close()
-        _scraper_instance = None
+    def close(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+                logger.info("🔒 Pestaña cerrada" if self.browser is not None else "🔒 Navegador cerrado")
+            except Exception as e:
+                logger.debug(f"Error cerrando el navegador: {e}")
+            finally:
+                self.driver = None
+                self.readiness = None
@@ -0,0 +1,65 @@
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class SingleFlightTimeout(Exception):
+    """El scrape compartido no terminó dentro del timeout del llamador"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    El primer llamador ejecuta la función; el resto espera su resultado (o su
+    excepción) en lugar de lanzar otra navegación.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+        elif not call.done.wait(timeout):
+            raise SingleFlightTimeout(f"Timeout esperando el scrape en curso de {key}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'shared': self.shared,
+            }
@@ -0,0 +1,251 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from metrics import THROTTLE_SIGNALS, span
+
+logger = logging.getLogger(__name__)
+
+
+# Señales de que Facebook nos está frenando
+SIGNALS = ('login_wall', 'checkpoint', 'empty_extraction', 'http_403', 'http_429')
+
+
+class ThrottleTimeout(Exception):
+    """El control adaptativo no dio turno dentro del tiempo de espera"""
+
+
+def block_signal(url: Optional[str]) -> Optional[str]:
+    """'checkpoint' o 'login_wall' si la URL final es una de esas pantallas"""
+    low = (url or '').lower()
+    if 'checkpoint' in low:
+        return 'checkpoint'
+    if '/login' in low or 'login.php' in low:
+        return 'login_wall'
+    return None
+
+
+def is_empty_result(result: Dict) -> bool:
+    """Página vacía (sin imágenes ni texto): lo que devuelve un muro de login que no redirige.
+
+    Un "Video no encontrado" en un post de fotos o texto es una respuesta correcta y no cuenta.
+    """
+    if result.get('success'):
+        post = result.get('post')
+        return post is not None and not post.get('images') and not post.get('text')
+    return bool(result.get('empty_page'))
+
+
+class AdaptiveThrottle:
+    """Límite de concurrencia y de tasa AIMD delante de todo lo que toca Facebook.
+
+    - Cada resultado sano suma: la concurrencia crece 1/limit (≈ +1 por
+      ventana completa) y la tasa crece `rate_step` req/s.
+    - Cada señal de bloqueo (muro de login, checkpoint, extracción vacía,
+      403/429 de fbcdn) multiplica ambos por `decrease`, como mucho una vez
+      por `cooldown` segundos para que una ráfaga de señales no los hunda.
+    - Con `max_rate` 0 no hay tope de tasa mientras no llegue ninguna señal:
+      la primera arranca uno en `backoff_rate` × `decrease` req/s, que se
+      levanta del todo cuando los éxitos lo devuelven a `backoff_rate`.
+    - La tasa se cobra por pedido lógico: el paso al navegador después de
+      un intento HTTP fallido pide turno con charge=False (sin token).
+    """
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = 1, max_rate: float = 0.0,
+                 min_rate: float = 0.05, decrease: float = 0.5, rate_step: float = 0.05,
+                 cooldown: float = 10.0, timeout: float = 30.0, backoff_rate: float = 2.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_rate = max_rate
+        # Techo de la tasa: el configurado, o el de arranque tras la primera señal
+        self.rate_ceiling = max_rate or backoff_rate
+        self.min_rate = min(min_rate, self.rate_ceiling) if self.rate_ceiling else 0.0
+        self.decrease = decrease
+        self.rate_step = rate_step
+        self.cooldown = cooldown
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self.limit = float(self.max_concurrency)
+        self.rate = float(max_rate)
+        self._tokens = 1.0
+        self._refilled_at = time.monotonic()
+        self._last_decrease = 0.0
+        self.active = 0
+        self.waiting = 0
+
+        # Métricas
+        self.granted = 0
+        self.timeouts = 0
+        self.successes = 0
+        self.decreases = 0
+        self.signals: Dict[str, int] = {name: 0 for name in SIGNALS}
+
+    def _refill(self, now: float):
+        if self.rate:
+            burst = max(1.0, self.limit)
+            self._tokens = min(burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self, timeout: Optional[float] = None, charge: bool = True):
+        """Espera un lugar de concurrencia y, con `charge`, un token de tasa"""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    has_slot = self.active < int(self.limit)
+                    has_token = not charge or not self.rate or self._tokens >= 1
+                    if has_slot and has_token:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise ThrottleTimeout(
+                            f"Facebook está limitando: sin turno tras {timeout:.1f}s "
+                            f"(concurrencia {int(self.limit)}, {self.rate:.2f} req/s)"
+                        )
+                    wait = remaining
+                    if has_slot:
+                        wait = min(remaining, (1 - self._tokens) / self.rate)
+                    self._cond.wait(wait)
+            finally:
+                self.waiting -= 1
+            if charge and self.rate:
+                self._tokens -= 1
+            self.active += 1
+            self.granted += 1
+
+    def try_acquire(self) -> bool:
+        """Turno sin espera (p. ej. para un hedge): True si había lugar y token"""
+        with self._cond:
+            self._refill(time.monotonic())
+            if self.active >= int(self.limit) or (self.rate and self._tokens < 1):
+                return False
+            if self.rate:
+                self._tokens -= 1
+            self.active += 1
+            self.granted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def signal(self, name: str):
+        THROTTLE_SIGNALS.inc(signal=name)
+        with self._cond:
+            self.signals[name] = self.signals.get(name, 0) + 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.decreases += 1
+            self.limit = max(float(self.min_concurrency), self.limit * self.decrease)
+            if not self.rate and self.rate_ceiling:
+                # Primera señal sin tope configurado: recién ahora se limita la tasa
+                self._tokens = 1.0
+                self._refilled_at = now
+                self.rate = self.rate_ceiling
+            if self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            logger.warning(f"🐢 Señal de bloqueo ({name}): concurrencia {self.limit:.2f}, {self.rate:.2f} req/s")
+
+    def success(self):
+        with self._cond:
+            self.successes += 1
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            if self.rate:
+                self.rate = min(self.rate_ceiling, self.rate + self.rate_step)
+                if not self.max_rate and self.rate >= self.rate_ceiling:
+                    # Recuperado: sin tope configurado se vuelve a controlar sólo la concurrencia
+                    self.rate = 0.0
+            self._cond.notify_all()
+
+    def observe(self, result: Optional[Dict]):
+        """Clasifica el resultado de un scrape que llegó a Facebook"""
+        if not result:
+            return
+        if result.get('blocked'):
+            self.signal(result['blocked'])
+        elif is_empty_result(result):
+            self.signal('empty_extraction')
+        elif result.get('success'):
+            self.success()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'concurrency_limit': round(self.limit, 3),
+                'max_concurrency': self.max_concurrency,
+                'rate_limit': round(self.rate, 3) if self.rate else None,
+                'max_rate': self.max_rate or None,
+                'active': self.active,
+                'waiting': self.waiting,
+                'granted': self.granted,
+                'timeouts': self.timeouts,
+                'successes': self.successes,
+                'decreases': self.decreases,
+                'signals': dict(self.signals),
+            }
+
+
+THROTTLE_ENABLED = os.environ.get('SCRAPER_THROTTLE', '1') not in ('0', 'false', 'no')
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+
+def get_throttle() -> Optional[AdaptiveThrottle]:
+    """Control compartido; None si SCRAPER_THROTTLE=0. El máximo por defecto es el tamaño del pool."""
+    global _throttle
+    if not THROTTLE_ENABLED:
+        return None
+    with _throttle_lock:
+        if _throttle is None:
+            max_concurrency = int(os.environ.get('SCRAPER_THROTTLE_MAX_CONCURRENCY', '0')) or \
+                int(os.environ.get('SCRAPER_POOL_SIZE', '2'))
+            _throttle = AdaptiveThrottle(
+                max_concurrency=max_concurrency,
+                min_concurrency=int(os.environ.get('SCRAPER_THROTTLE_MIN_CONCURRENCY', '1')),
+                max_rate=float(os.environ.get('SCRAPER_THROTTLE_MAX_RATE', '0')),
+                backoff_rate=float(os.environ.get('SCRAPER_THROTTLE_BACKOFF_RATE', '2')),
+                min_rate=float(os.environ.get('SCRAPER_THROTTLE_MIN_RATE', '0.05')),
+                cooldown=float(os.environ.get('SCRAPER_THROTTLE_COOLDOWN', '10')),
+                timeout=float(os.environ.get('SCRAPER_THROTTLE_TIMEOUT', '60')),
+            )
+            logger.info(f"🚥 Control adaptativo creado (concurrencia ≤ {max_concurrency})")
+        return _throttle
+
+
+@contextmanager
+def facebook_slot(charge: bool = True):
+    """Turno del control adaptativo para cualquier trabajo que llega a Facebook.
+
+    charge=False cuando el mismo pedido ya pagó su token (p. ej. el navegador tras el tier HTTP).
+    """
+    throttle = get_throttle()
+    if throttle is None:
+        yield None
+        return
+    with span('throttle_wait'):
+        throttle.acquire(charge=charge)
+    try:
+        yield throttle
+    finally:
+        throttle.release()
+
+
+def report_signal(name: str):
+    """Señal detectada fuera de un resultado (tier HTTP, sondeos a fbcdn)"""
+    throttle = get_throttle()
+    if throttle:
+        throttle.signal(name)
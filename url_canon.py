@@ -0,0 +1,306 @@
+import ipaddress
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+from http_client import MOBILE_USER_AGENT, get_http_session
+from result_cache import TTLLRUCache
+from result_store import get_result_store
+from singleflight import SingleFlight
+from throttle import block_signal, facebook_slot, report_signal
+
+logger = logging.getLogger(__name__)
+
+
+MOBILE_HOST = 'm.facebook.com'
+
+# Parámetros de seguimiento/atribución: no cambian el contenido, sólo fragmentan la cache
+TRACKING_PARAMS = {
+    'mibextid', 'rdid', 'share_url', 'fbclid', 'ref', 'refsrc', 'refid', 'ref_component', 'ref_page',
+    '_rdr', '_rdc', 'sfnsn', 'extid', 'paipv', 'eav', 'notif_id', 'notif_t', 'hc_ref', 'hc_location',
+    'fref', 'app', 'locale', 'wtsid', 'sfns', 'acontext', 'comment_tracking', 'd', 'vh', 'm_entstream_source',
+}
+TRACKING_PREFIXES = ('__cft__', '__tn__', '__xts__', 'utm_')
+
+# Cuántos saltos se siguen al resolver un enlace corto por HTTP
+MAX_REDIRECTS = 5
+
+_POSTS_RE = re.compile(r'/([^/]+)/posts/([^/?]+)')
+_GROUP_POST_RE = re.compile(r'^/groups/([^/]+)/(?:posts|permalink)/([^/?]+)')
+_PHOTOS_RE = re.compile(r'/([^/]+)/photos/[^/]+/([^/?]+)')
+_VIDEOS_RE = re.compile(r'^/(?:([^/]+)/)?videos/(?:[^/]+/)*?(\d+)/?$')
+_REEL_RE = re.compile(r'^/reels?/(\d+)')
+_SHARE_RE = re.compile(r'^/share/(?:([a-z])/)?([^/?]+)', re.IGNORECASE)
+
+
+def is_loopback_host(hostname: Optional[str]) -> bool:
+    if not hostname:
+        return False
+    if hostname == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(hostname).is_loopback
+    except ValueError:
+        return False
+
+
+def _with_scheme(url: str) -> str:
+    url = (url or '').strip()
+    return url if url.startswith('http') else 'https://' + url
+
+
+def is_facebook_host(hostname: Optional[str]) -> bool:
+    host = (hostname or '').lower()
+    return host in ('facebook.com', 'fb.com', 'fb.watch') or host.endswith(('.facebook.com', '.fb.com'))
+
+
+def is_facebook_url(url: str) -> bool:
+    return is_facebook_host(urlparse(_with_scheme(url)).hostname)
+
+
+def _is_tracking(name: str) -> bool:
+    return name.lower() in TRACKING_PARAMS or name.lower().startswith(TRACKING_PREFIXES)
+
+
+def _identify(host: str, path: str, query: Dict[str, str]):
+    """(tipo, dueño, id) de una URL de contenido, o None si no se reconoce"""
+    if host == 'fb.watch':
+        token = path.strip('/')
+        return ('short', None, token) if token else None
+
+    bare = path.rstrip('/') or '/'
+    if bare in ('/watch', '/watch/live', '/video.php') and (query.get('v') or query.get('video_id')):
+        return 'video', None, query.get('v') or query.get('video_id')
+    if bare in ('/story.php', '/permalink.php') and query.get('story_fbid'):
+        return 'post', query.get('id'), query['story_fbid']
+    if bare in ('/photo.php', '/photo') and query.get('fbid'):
+        return 'photo', None, query['fbid']
+
+    match = _REEL_RE.match(path)
+    if match:
+        return 'reel', None, match.group(1)
+    match = _SHARE_RE.match(path)
+    if match:
+        return 'share', (match.group(1) or '').lower() or None, match.group(2)
+    match = _VIDEOS_RE.match(path)
+    if match:
+        return 'video', match.group(1), match.group(2)
+    match = _GROUP_POST_RE.match(path)
+    if match:
+        return 'post', match.group(1), match.group(2)
+    match = _POSTS_RE.search(path)
+    if match:
+        return 'post', match.group(1), match.group(2)
+    match = _PHOTOS_RE.search(path)
+    if match:
+        return 'photo', match.group(1), match.group(2)
+    return None
+
+
+def canonicalize(url: str) -> Dict[str, Optional[str]]:
+    """Identidad estable de una URL de Facebook, sin tocar la red.
+
+    Devuelve {'kind', 'owner', 'content_id', 'key', 'mobile_url', 'needs_resolve'}.
+    Todas las formas de un mismo contenido (watch?v=, /reel/, /videos/, story.php,
+    permalink.php, /posts/, con o sin parámetros de seguimiento) dan la misma
+    'key'; 'mobile_url' es la URL móvil directa. Los enlaces /share/ y fb.watch
+    quedan con needs_resolve=True: su contenido sólo se conoce tras la redirección.
+    """
+    url = _with_scheme(url)
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    query = dict(parse_qsl(parsed.query, keep_blank_values=True))
+    identity = _identify(host, parsed.path, query)
+
+    # Servidores locales (p. ej. bench/server.py) conservan host y esquema
+    if is_loopback_host(parsed.hostname):
+        base = (parsed.scheme, parsed.netloc)
+    elif is_facebook_host(host):
+        base = ('https', MOBILE_HOST)
+    else:
+        netloc = parsed.netloc.lower()
+        if netloc.startswith('www.'):
+            netloc = netloc[4:]
+        base = (parsed.scheme, netloc if netloc.startswith('m.') else 'm.' + netloc)
+
+    def build(path: str, params: Optional[Dict[str, str]] = None) -> str:
+        return urlunparse(base + (path, '', urlencode(params or {}), ''))
+
+    result = {'kind': None, 'owner': None, 'content_id': None, 'needs_resolve': False}
+    if identity is None:
+        kept = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if not _is_tracking(k)]
+        mobile_url = urlunparse(base + (parsed.path, '', urlencode(kept), ''))
+        result.update(key=f'url:{mobile_url}', mobile_url=mobile_url)
+        return result
+
+    kind, owner, content_id = identity
+    result.update(kind=kind, owner=owner, content_id=content_id)
+    if kind == 'short':
+        result.update(key=f'fbwatch:{content_id}', mobile_url=f'https://fb.watch/{content_id}/', needs_resolve=True)
+    elif kind == 'share':
+        share_path = f"/share/{owner + '/' if owner else ''}{content_id}/"
+        result.update(key=f"share:{owner or '-'}:{content_id}", mobile_url=build(share_path), needs_resolve=True)
+    elif kind in ('video', 'reel'):
+        # Un reel es un video con otra interfaz: comparten id y entrada de cache
+        if kind == 'reel':
+            path, params = f'/reel/{content_id}', None
+        elif owner:
+            path, params = parsed.path, None
+        else:
+            path, params = '/watch/', {'v': content_id}
+        result.update(key=f'video:{content_id}', mobile_url=build(path, params))
+    elif kind == 'post' and parsed.path.rstrip('/') in ('/story.php', '/permalink.php'):
+        params = {'story_fbid': content_id}
+        if owner:
+            params['id'] = owner
+        result.update(key=f'post:{content_id}', mobile_url=build('/story.php', params))
+    elif kind == 'photo' and parsed.path.rstrip('/') in ('/photo.php', '/photo'):
+        result.update(key=f'photo:{content_id}', mobile_url=build('/photo.php', {'fbid': content_id}))
+    else:
+        result.update(key=f'{kind}:{content_id}', mobile_url=build(parsed.path))
+    return result
+
+
+class RedirectTable:
+    """Destino ya resuelto de cada enlace corto (/share/..., fb.watch).
+
+    Vive en memoria y, si está activo, en el store de resultados compartido con
+    otros workers, así un enlace se resuelve una sola vez en todo el servicio.
+    Los enlaces que no se pudieron resolver se recuerdan `failure_ttl` segundos
+    (sólo en memoria) para no repetir el intento en cada pedido.
+    """
+
+    def __init__(self, ttl: float = 7 * 86400, max_entries: int = 10000, failure_ttl: float = 300):
+        self.ttl = ttl
+        self._memory = TTLLRUCache(max_entries=max_entries, default_ttl=ttl)
+        self._failed = TTLLRUCache(max_entries=max_entries, default_ttl=failure_ttl)
+        self.resolved_http = 0
+        self.resolved_browser = 0
+        self.failures = 0
+
+    def lookup(self, key: str) -> Optional[str]:
+        target = self._memory.get(key)
+        if target is not None:
+            return target
+        store = get_result_store()
+        stored = store.get(f'redirect:{key}') if store else None
+        if stored is None:
+            return None
+        value, expires_at = stored
+        self._memory.set(key, value['url'], min(self.ttl, expires_at - time.time()))
+        return value['url']
+
+    def remember(self, key: str, target: str):
+        self._memory.set(key, target)
+        store = get_result_store()
+        if store:
+            store.set(f'redirect:{key}', {'url': target}, self.ttl)
+
+    def remember_failure(self, key: str):
+        self.failures += 1
+        self._failed.set(key, True)
+
+    def recently_failed(self, key: str) -> bool:
+        return self._failed.get(key) is not None
+
+    def stats(self) -> Dict:
+        return dict(self._memory.stats(), resolved_http=self.resolved_http,
+                    resolved_browser=self.resolved_browser, failures=self.failures,
+                    failed_entries=self._failed.stats()['entries'])
+
+
+def _follow_redirects(url: str, timeout: float = 5.0) -> Optional[str]:
+    """Sigue las redirecciones por HTTP hasta una URL de contenido reconocible"""
+    session = get_http_session()
+    for _ in range(MAX_REDIRECTS):
+        try:
+            r = session.get(url, headers={'User-Agent': MOBILE_USER_AGENT}, allow_redirects=False,
+                            timeout=timeout, stream=True)
+            r.close()
+        except Exception as e:
+            logger.debug(f"No se pudo resolver {url}: {e}")
+            return None
+        location = r.headers.get('Location')
+        if not r.is_redirect or not location:
+            return None
+        url = urljoin(url, location)
+        blocked = block_signal(url)
+        if blocked:
+            # El enlace llevó al login o a un checkpoint: también es una señal de bloqueo
+            report_signal(blocked)
+            return None
+        canon = canonicalize(url)
+        if canon['kind'] and not canon['needs_resolve']:
+            return canon['mobile_url']
+    return None
+
+
+RESOLVE_SHORT_LINKS = os.environ.get('SCRAPER_RESOLVE_SHORT_LINKS', '1') not in ('0', 'false', 'no')
+
+_redirects = None
+_redirects_lock = threading.Lock()
+
+
+def get_redirect_table() -> RedirectTable:
+    global _redirects
+    with _redirects_lock:
+        if _redirects is None:
+            _redirects = RedirectTable(
+                ttl=float(os.environ.get('SCRAPER_REDIRECT_TTL', str(7 * 86400))),
+                failure_ttl=float(os.environ.get('SCRAPER_REDIRECT_FAILURE_TTL', '300')),
+            )
+        return _redirects
+
+
+# Pedidos simultáneos del mismo enlace corto comparten una sola resolución
+_resolving = SingleFlight()
+
+
+def resolve(url: str, fetch: bool = True) -> Dict[str, Optional[str]]:
+    """canonicalize() que además resuelve enlaces cortos con la tabla de redirecciones.
+
+    Con fetch=True un enlace que no está en la tabla se resuelve por HTTP (sin
+    navegador, con turno del throttle) y se guarda; si no se puede, el fallo
+    queda anotado un rato y el navegador sigue la redirección (ver
+    remember_redirect). Con fetch=False sólo se consulta la tabla.
+    """
+    canon = canonicalize(url)
+    if not canon['needs_resolve']:
+        return canon
+    table = get_redirect_table()
+    target = table.lookup(canon['key'])
+    if target is None and fetch and RESOLVE_SHORT_LINKS and not table.recently_failed(canon['key']):
+        target = _resolving.do(canon['key'], lambda: _resolve_over_http(table, canon))
+    return canonicalize(target) if target else canon
+
+
+def _resolve_over_http(table: RedirectTable, canon: Dict) -> Optional[str]:
+    # Otro pedido pudo resolverlo mientras se esperaba
+    target = table.lookup(canon['key'])
+    if target is not None:
+        return target
+    with facebook_slot():
+        target = _follow_redirects(canon['mobile_url'])
+    if target:
+        table.resolved_http += 1
+        table.remember(canon['key'], target)
+    else:
+        table.remember_failure(canon['key'])
+    return target
+
+
+def remember_redirect(requested_url: str, final_url: Optional[str]):
+    """Registra adónde llevó el navegador a un enlace corto para no repetir el salto"""
+    canon = canonicalize(requested_url)
+    if not canon['needs_resolve'] or not final_url:
+        return
+    final = canonicalize(final_url)
+    if final['kind'] and not final['needs_resolve']:
+        table = get_redirect_table()
+        if table.lookup(canon['key']) is None:
+            table.resolved_browser += 1
+            table.remember(canon['key'], final['mobile_url'])
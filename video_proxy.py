@@ -0,0 +1,124 @@
+import logging
+import os
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+from http_client import get_http_session, DEFAULT_USER_AGENT
+from media_cache import MediaCache, parse_content_range
+from scraper_selenium import FacebookSeleniumScraper
+
+logger = logging.getLogger(__name__)
+
+
+CHUNK_SIZE = int(os.environ.get('VIDEO_PROXY_CHUNK_SIZE', str(256 * 1024)))
+UPSTREAM_TIMEOUT = float(os.environ.get('VIDEO_PROXY_TIMEOUT', '15'))
+
+# Cabeceras de la respuesta de fbcdn que se reenvían al cliente
+FORWARD_RESPONSE_HEADERS = ('Content-Type', 'Content-Length', 'Content-Range', 'Accept-Ranges', 'Last-Modified', 'ETag')
+
+# Cabeceras del cliente que se reenvían a fbcdn (seek / reanudación)
+FORWARD_REQUEST_HEADERS = ('Range', 'If-Range')
+
+
+def referer_candidates(result: Dict) -> List[str]:
+    """Referers a probar, empezando por el que ya funcionó en el sondeo del scrape"""
+    referers = []
+    probe = result.get('probe') or {}
+    probe_mobile = result.get('probe_mobile') or {}
+    if probe_mobile.get('ok') and not probe.get('ok'):
+        referers.append(result.get('mobile_url'))
+    referers.extend([result.get('url'), result.get('mobile_url')])
+    return [r for i, r in enumerate(referers) if r and r not in referers[:i]]
+
+
+def open_upstream(video_url: str, referers: List[str], client_headers: Dict[str, str]) -> Optional[requests.Response]:
+    """Abre la descarga en streaming contra fbcdn; prueba cada referer hasta obtener 200/206/416.
+
+    Devuelve la respuesta sin consumir (el llamador debe cerrarla) o None si
+    todos los intentos fallaron.
+    """
+    session = get_http_session()
+    # identity: los bytes se reenvían tal cual, junto con Content-Length/Content-Range
+    base = {"User-Agent": DEFAULT_USER_AGENT, "Accept-Encoding": "identity"}
+    for name in FORWARD_REQUEST_HEADERS:
+        value = client_headers.get(name) or client_headers.get(name.lower())
+        if value:
+            base[name] = value
+
+    last_status = None
+    for referer in referers or [None]:
+        headers = dict(base)
+        if referer:
+            headers["Referer"] = referer
+        try:
+            r = session.get(video_url, headers=headers, stream=True, allow_redirects=True, timeout=UPSTREAM_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error abriendo upstream de video: {e}")
+            continue
+        if r.status_code in (200, 206, 416):
+            return r
+        last_status = r.status_code
+        r.close()
+
+    logger.warning(f"Upstream de video rechazó la descarga (status {last_status})")
+    return None
+
+
+def download_filename(post_url: str) -> str:
+    post_id = FacebookSeleniumScraper.parse_facebook_url(post_url).get('post_id')
+    safe = ''.join(ch for ch in (post_id or '') if ch.isalnum() or ch in '-_')
+    return f"{safe or 'video'}.mp4"
+
+
+def response_headers(upstream: requests.Response) -> Dict[str, str]:
+    headers = {}
+    for name in FORWARD_RESPONSE_HEADERS:
+        value = upstream.headers.get(name)
+        if value:
+            headers[name] = value
+    headers.setdefault('Accept-Ranges', 'bytes')
+    return headers
+
+
+def iter_upstream(upstream: requests.Response, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Reenvía el cuerpo en bloques de tamaño fijo sin acumularlo en memoria"""
+    try:
+        for chunk in upstream.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        upstream.close()
+
+
+def media_key(result: Dict, post_url: str) -> str:
+    """Clave de la cache de media: URL de video normalizada + id del video en Facebook"""
+    video_id = FacebookSeleniumScraper.parse_facebook_url(post_url).get('post_id')
+    return MediaCache.make_key(result['video_url'], video_id)
+
+
+def cached_response_headers(hit: Dict, ranged: bool) -> Dict[str, str]:
+    headers = {
+        'Content-Type': hit['content_type'],
+        'Content-Length': str(hit['end'] - hit['start'] + 1),
+        'Accept-Ranges': 'bytes',
+    }
+    if ranged:
+        headers['Content-Range'] = f"bytes {hit['start']}-{hit['end']}/{hit['total']}"
+    return headers
+
+
+def tee_to_cache(cache: MediaCache, key: str, upstream: requests.Response, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Copia a disco lo que se reenvía al cliente, si la respuesta permite ubicar los bytes"""
+    if upstream.headers.get('Content-Encoding', 'identity') != 'identity':
+        return chunks
+    content_type = upstream.headers.get('Content-Type')
+    if upstream.status_code == 200:
+        length = upstream.headers.get('Content-Length')
+        if length and length.isdigit():
+            return cache.tee(key, chunks, 0, int(length), content_type)
+    elif upstream.status_code == 206:
+        content_range = parse_content_range(upstream.headers.get('Content-Range'))
+        if content_range:
+            return cache.tee(key, chunks, content_range[0], content_range[2], content_type)
+    return chunks